@@ -0,0 +1,176 @@
+"""End-to-end benchmark of the three lineage extractors on synthetic corpora.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_lineage --save-baseline benchmarks/baseline.json
+    python -m benchmarks.bench_lineage --compare benchmarks/baseline.json
+
+Each extractor runs in a fresh process so its peak RSS is its own. Output writing is left
+out; only reading, splitting and extraction are measured.
+"""
+import argparse
+import dataclasses
+import importlib.machinery
+import importlib.util
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.corpus import PROFILES, generate_corpus
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Throughput drops beyond this fraction of the baseline count as regressions
+DEFAULT_TOLERANCE = 0.10
+
+
+def _load_script(file_name):
+    # sql_parser has no .py extension, so it is loaded through an explicit source loader
+    path = os.path.join(REPO_ROOT, file_name)
+    loader = importlib.machinery.SourceFileLoader(file_name.replace('.py', ''), path)
+    spec = importlib.util.spec_from_loader(loader.name, loader)
+    module = importlib.util.module_from_spec(spec)
+    loader.exec_module(module)
+    return module
+
+
+def _rows_parser(file_paths):
+    module = _load_script('parser.py')
+    return sum(len(module.parse_sql_file(path)) for path in file_paths)
+
+
+def _rows_last_working_version(file_paths):
+    module = _load_script('last_working_version.py')
+    rows = 0
+    for path in file_paths:
+        tables = module.extract_tables_and_columns(module.split_statements(path))
+        rows += sum(len(table['columns']) for table in tables.values())
+    return rows
+
+
+def _rows_sql_parser(file_paths):
+    module = _load_script('sql_parser')
+    rows = 0
+    for path in file_paths:
+        for table in module.parse_sql_file(path).values():
+            rows += sum(len(statement_keys) for statement_keys in table['columns'].values())
+    return rows
+
+
+EXTRACTORS = {
+    'parser.py': _rows_parser,
+    'last_working_version.py': _rows_last_working_version,
+    'sql_parser': _rows_sql_parser,
+}
+
+
+def _measure(extractor, file_paths):
+    # Runs in a fresh process: import, then time a full pass over the corpus
+    sys.path.insert(0, REPO_ROOT)
+    start = time.perf_counter()
+    rows = EXTRACTORS[extractor](file_paths)
+    seconds = time.perf_counter() - start
+    # ru_maxrss is in kilobytes on Linux
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return seconds, rows, peak_rss_mb
+
+
+def run_benchmark(profiles, extractors, scale, seed):
+    results = {}
+    context = multiprocessing.get_context('spawn')
+    for profile in profiles:
+        spec = PROFILES[profile]
+        spec = dataclasses.replace(spec, files=max(1, int(spec.files * scale)))
+        with tempfile.TemporaryDirectory() as folder:
+            file_paths = generate_corpus(folder, spec, seed)
+            size_mb = sum(os.path.getsize(path) for path in file_paths) / (1024 * 1024)
+            for extractor in extractors:
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    seconds, rows, peak_rss_mb = executor.submit(_measure, extractor, file_paths).result()
+                results.setdefault(profile, {})[extractor] = {
+                    'files_per_sec': round(len(file_paths) / seconds, 2),
+                    'mb_per_sec': round(size_mb / seconds, 3),
+                    'peak_rss_mb': round(peak_rss_mb, 1),
+                    'rows': rows,
+                }
+    return results
+
+
+def print_results(results, baseline=None):
+    print(f"{'profile':<18}{'extractor':<26}{'files/s':>10}{'MB/s':>9}{'peak RSS MB':>13}{'rows':>10}"
+          + (f"{'vs baseline':>14}" if baseline else ""))
+    for profile, by_extractor in results.items():
+        for extractor, result in by_extractor.items():
+            line = (f"{profile:<18}{extractor:<26}{result['files_per_sec']:>10.1f}{result['mb_per_sec']:>9.2f}"
+                    f"{result['peak_rss_mb']:>13.1f}{result['rows']:>10}")
+            previous = (baseline or {}).get(profile, {}).get(extractor)
+            if previous:
+                change = result['mb_per_sec'] / previous['mb_per_sec'] - 1
+                line += f"{change:>+13.1%}"
+            print(line)
+
+
+def regressions(results, baseline, tolerance):
+    # Slower than the baseline by more than the tolerance, or different output row counts
+    found = []
+    for profile, by_extractor in results.items():
+        for extractor, result in by_extractor.items():
+            previous = baseline.get(profile, {}).get(extractor)
+            if not previous:
+                continue
+            if result['mb_per_sec'] < previous['mb_per_sec'] * (1 - tolerance):
+                found.append(f"{profile}/{extractor}: {previous['mb_per_sec']:.2f} -> {result['mb_per_sec']:.2f} MB/s")
+            if result['rows'] != previous['rows']:
+                found.append(f"{profile}/{extractor}: rows {previous['rows']} -> {result['rows']}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--profile', nargs='+', choices=sorted(PROFILES), default=sorted(PROFILES))
+    parser.add_argument('--extractor', nargs='+', choices=list(EXTRACTORS), default=list(EXTRACTORS))
+    # Both default to the baseline's values with --compare, otherwise to 1 and 0
+    parser.add_argument('--scale', type=float, help='Multiplier on the file count of each profile')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--save-baseline', metavar='PATH')
+    parser.add_argument('--compare', metavar='PATH', help='Baseline JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            saved = json.load(f)
+        # Throughput is only comparable on the same corpus, so the baseline's scale and seed are used
+        for name in ('scale', 'seed'):
+            if getattr(args, name) is None:
+                setattr(args, name, saved[name])
+            elif getattr(args, name) != saved[name]:
+                parser.error(f"--{name} {getattr(args, name)} differs from the baseline's {saved[name]}")
+        baseline = saved['results']
+    args.scale = 1.0 if args.scale is None else args.scale
+    args.seed = 0 if args.seed is None else args.seed
+
+    results = run_benchmark(args.profile, args.extractor, args.scale, args.seed)
+    print_results(results, baseline)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({'scale': args.scale, 'seed': args.seed, 'results': results}, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if baseline:
+        found = regressions(results, baseline, args.tolerance)
+        for regression in found:
+            print(f"REGRESSION {regression}")
+        if found:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Write throughput of each lineage output backend.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_output --rows 1000000
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import tempfile
+
+import pandas as pd
+
+import lineage_output
+
+EXTENSIONS = {'csv': '.csv', 'parquet': '.parquet', 'sqlite': '.db', 'excel': '.xlsx'}
+
+
+def make_lineage(rng, rows):
+    return pd.DataFrame({
+        'Schema': [f"schema_{rng.randrange(20)}" for _ in range(rows)],
+        'Table': [f"table_{rng.randrange(500)}" for _ in range(rows)],
+        'Column': [f"column_{rng.randrange(2000)}" for _ in range(rows)],
+        'Statement ID': [rng.randrange(1, 50000) for _ in range(rows)],
+        'Line Number': [rng.randrange(1, 10000) for _ in range(rows)],
+        'File Name': [f"job_{rng.randrange(4000)}.sql" for _ in range(rows)],
+    })
+
+
+def output_size(folder):
+    return sum(os.path.getsize(os.path.join(folder, name)) for name in os.listdir(folder))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--excel-rows', type=int, default=50000,
+                        help='openpyxl is far slower than the others, so Excel gets a smaller frame')
+    parser.add_argument('--seed', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    df = make_lineage(rng, args.rows)
+
+    print(f"{'backend':<10}{'rows':>10}{'seconds':>10}{'rows/s':>12}{'MB on disk':>12}")
+    for backend, extension in EXTENSIONS.items():
+        if backend == 'parquet' and lineage_output.pyarrow is None:
+            print(f"{backend:<10}{'skipped, pyarrow not installed':>54}")
+            continue
+        frame = df.head(args.excel_rows) if backend == 'excel' else df
+        with tempfile.TemporaryDirectory() as folder:
+            with contextlib.redirect_stdout(io.StringIO()):
+                elapsed = lineage_output.write_table(frame, os.path.join(folder, 'lineage' + extension), backend)
+            size_mb = output_size(folder) / (1024 * 1024)
+        print(f"{backend:<10}{len(frame):>10}{elapsed:>10.2f}{len(frame) / elapsed:>12.0f}{size_mb:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
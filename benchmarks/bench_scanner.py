@@ -0,0 +1,101 @@
+"""Micro-benchmark: single-pass scanner vs. the per-clause regex extraction.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_scanner
+"""
+import argparse
+import os
+import random
+import re
+import time
+
+from sql_scanner import scan_statement
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def legacy_regex_path(statement):
+    # The regex passes the extractors ran per statement before sql_scanner existed
+    result = {'tables': [], 'columns': [], 'joins': [], 'conditions': []}
+    select_match = re.search(r'SELECT\s+(.*?)\s+FROM', statement, re.IGNORECASE)
+    if select_match:
+        result['columns'] = [col.strip() for col in re.split(r',\s*', select_match.group(1).strip())]
+    from_part = re.search(r'FROM\s+(.*?)(\s+WHERE|\s+JOIN|$)', statement, re.IGNORECASE)
+    if from_part:
+        result['tables'] = re.split(r',\s*|\s+JOIN\s+', from_part.group(1).strip())
+    result['joins'] = re.findall(r'JOIN\s+([^\s]+)\s*(AS\s+)?([a-zA-Z0-9_]+)?', statement, re.IGNORECASE)
+    for on_condition in re.findall(r'ON\s+(.*?)\s*(?:WHERE|JOIN|$)', statement, re.IGNORECASE):
+        result['conditions'].extend(cond.strip() for cond in re.split(r'AND', on_condition))
+    result['tables'].extend(re.findall(
+        r"(FROM|JOIN)\s+([a-zA-Z_][a-zA-Z0-9_]*)(?:\.\s*([a-zA-Z_][a-zA-Z0-9_]*))?(?:\s+AS\s+([a-zA-Z_][a-zA-Z0-9_]*))?",
+        statement, re.IGNORECASE))
+    re.search(r"SELECT\s+(.*?)\s+(?:FROM|WHERE|GROUP BY|ORDER BY|LIMIT|HAVING)", statement, re.IGNORECASE)
+    return result
+
+
+# Typical warehouse column names; several end in "on" / contain "join", like real ETL output does
+COLUMN_STEMS = ['customer_id', 'region', 'transaction', 'description', 'amount', 'load_date', 'join_key',
+                'currency', 'status', 'position', 'from_date', 'version']
+
+
+def synthetic_statement(rng, lines, joins):
+    """Generated-ETL style statement of roughly `lines` lines with `joins` joined tables"""
+    aliases = [f"t{i}" for i in range(joins + 1)]
+    column_lines = max(1, lines - 3 * joins - 4)
+    columns = [f"    {rng.choice(aliases)}.{rng.choice(COLUMN_STEMS)}_{i} AS {rng.choice(COLUMN_STEMS)}_{i}"
+               for i in range(column_lines)]
+    parts = ["SELECT", ",\n".join(columns), "FROM", f"    etl.source_0 {aliases[0]}"]
+    for i in range(1, joins + 1):
+        parts.append("LEFT JOIN")
+        parts.append(f"    etl.source_{i} {aliases[i]}")
+        parts.append(f"    ON {aliases[i - 1]}.key_{i} = {aliases[i]}.key_{i} AND {aliases[i]}.active = 'Y'")
+    parts.append("WHERE")
+    parts.append(f"    {aliases[0]}.load_date >= '2020-01-01'")
+    return "\n".join(parts)
+
+
+def load_corpora(sql_file, rng):
+    with open(sql_file, 'r') as f:
+        bundled = [stmt.strip() for stmt in f.read().split(';') if stmt.strip()]
+    return [
+        ('sqlfile.sql', bundled),
+        ('synthetic 200 lines / 10 joins', [synthetic_statement(rng, 200, 10) for _ in range(20)]),
+        ('synthetic 2000 lines / 40 joins', [synthetic_statement(rng, 2000, 40) for _ in range(5)]),
+    ]
+
+
+def statements_per_second(fn, statements, min_time):
+    runs = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_time:
+        for statement in statements:
+            fn(statement)
+        runs += 1
+        elapsed = time.perf_counter() - start
+    return runs * len(statements) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sql-file', default=os.path.join(REPO_ROOT, 'sqlfile.sql'))
+    parser.add_argument('--min-time', type=float, default=1.0, help='Seconds to run each measurement for')
+    parser.add_argument('--seed', type=int, default=1984)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    # The lazy SELECT ... FROM regex stops at the first FROM inside a function call or subquery,
+    # so the column counts matter as much as the rates
+    print(f"{'corpus':<34}{'regex stmt/s':>14}{'cols':>7}{'scanner stmt/s':>16}{'cols':>7}{'speedup':>10}")
+    for name, statements in load_corpora(args.sql_file, rng):
+        regex_rate = statements_per_second(legacy_regex_path, statements, args.min_time)
+        scanner_rate = statements_per_second(scan_statement, statements, args.min_time)
+        regex_columns = sum(len(legacy_regex_path(statement)['columns']) for statement in statements)
+        scanner_columns = sum(len(scan_statement(statement)['columns']) for statement in statements)
+        print(f"{name:<34}{regex_rate:>14.1f}{regex_columns:>7}{scanner_rate:>16.1f}{scanner_columns:>7}"
+              f"{scanner_rate / regex_rate:>9.2f}x")
+
+
+if __name__ == '__main__':
+    main()
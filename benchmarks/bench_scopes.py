@@ -0,0 +1,63 @@
+"""Micro-benchmark: scope resolution cost against subquery and CTE nesting depth.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_scopes
+
+Every scope is resolved once and memoized, so time per nesting level should stay flat as
+the depth grows; a rising us/level column means something is re-resolving inner scopes.
+"""
+import argparse
+import time
+
+from sql_scanner import scan_statement
+from sql_scope import resolve_lineage
+
+# The scanner and resolver recurse per level, so depths stay well below Python's recursion limit
+DEPTHS = [10, 25, 50, 100, 200]
+
+
+def nested_subqueries(depth, columns=5):
+    # SELECT q.c0, ... FROM (SELECT c0, ... FROM (... FROM etl.source) q) q
+    names = ", ".join(f"c{i}" for i in range(columns))
+    outer = ", ".join(f"q.c{i}" for i in range(columns))
+    return f"SELECT {outer} FROM " + f"(SELECT {names} FROM " * depth + "etl.source" + ") q" * depth
+
+
+def chained_ctes(depth, columns=5):
+    # WITH s0 AS (SELECT ... FROM etl.source), s1 AS (SELECT ... FROM s0), ... SELECT ... FROM s<depth-1>
+    names = ", ".join(f"c{i}" for i in range(columns))
+    ctes = [f"s0 AS (SELECT {names} FROM etl.source)"]
+    ctes.extend(f"s{level} AS (SELECT {names} FROM s{level - 1})" for level in range(1, depth))
+    return "WITH " + ",\n".join(ctes) + f"\nSELECT {names} FROM s{depth - 1}"
+
+
+def seconds_per_statement(statement, min_time):
+    runs = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_time:
+        resolve_lineage(scan_statement(statement))
+        runs += 1
+        elapsed = time.perf_counter() - start
+    return elapsed / runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--min-time', type=float, default=0.5, help='Seconds to run each measurement for')
+    args = parser.parse_args()
+
+    print(f"{'shape':<20}{'depth':>7}{'ms/stmt':>10}{'us/level':>10}{'resolved':>10}")
+    for shape, build in [('nested subqueries', nested_subqueries), ('chained CTEs', chained_ctes)]:
+        for depth in DEPTHS:
+            statement = build(depth)
+            seconds = seconds_per_statement(statement, args.min_time)
+            columns = resolve_lineage(scan_statement(statement))['columns']
+            resolved = sum(1 for column in columns if column['sources'])
+            print(f"{shape:<20}{depth:>7}{seconds * 1000:>10.2f}{seconds * 1e6 / depth:>10.1f}"
+                  f"{resolved:>6}/{len(columns):<3}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Throughput and memory of the mmap statement splitter on a generated dump file.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_splitter --size-mb 200
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from sql_splitter import split_statements
+
+STATEMENT = ("-- nightly load; batch {index}\n"
+             "INSERT INTO sales.orders_{index}\n"
+             "SELECT o.order_id, o.note, 'a;b' AS tag /* keep; going */\n"
+             "FROM staging.orders o\n"
+             "WHERE o.batch = {index};\n\n")
+
+
+def write_dump(path, size_mb):
+    target = size_mb * 1024 * 1024
+    written = 0
+    index = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        while written < target:
+            text = STATEMENT.format(index=index)
+            f.write(text)
+            written += len(text)
+            index += 1
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size-mb', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'dump.sql')
+        expected = write_dump(path, args.size_mb)
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+
+        start = time.perf_counter()
+        statements = 0
+        last_line = 0
+        for start_line, end_line, statement in split_statements(path):
+            statements += 1
+            last_line = end_line
+        elapsed = time.perf_counter() - start
+
+        # Second pass under tracemalloc, which slows allocation down too much to time the first
+        tracemalloc.start()
+        for _ in split_statements(path):
+            pass
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    print(f"file size        {size_mb:.1f} MB")
+    print(f"statements       {statements} (expected {expected}), last line {last_line}")
+    print(f"throughput       {size_mb / elapsed:.1f} MB/s, {statements / elapsed:.0f} statements/s")
+    print(f"peak allocation  {peak / 1024:.1f} KB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""Benchmark: indexed add_static_columns vs. the per-row boolean-mask loop it replaced.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_static_columns --rows 10000 100000 1000000
+
+The second table times wildcard/regex rule classification: the combined matcher against
+testing each compiled rule in turn.
+"""
+import argparse
+import contextlib
+import io
+import random
+import re
+import time
+
+import pandas as pd
+
+from parser import STATIC_COLUMNS, add_static_columns
+from static_rules import RuleMatcher, field_regex
+
+
+def legacy_add_static_columns(df, static_data_df):
+    # The iterrows loop from before the index, minus its per-column prints
+    updated_rows = []
+    for index, row in df.iterrows():
+        row_values = ("N/A",) * len(STATIC_COLUMNS)
+        for column in row['Columns'].split(','):
+            column = column.strip()
+            match = static_data_df[
+                (static_data_df['Column Name'].str.lower() == column.lower()) &
+                (static_data_df['Schema Name'].str.lower() == row['Schema'].lower()) &
+                (static_data_df['Table Name'].str.lower() == row['Table'].lower())
+                ]
+            if not match.empty:
+                row_values = tuple(match[name].values[0] for name in STATIC_COLUMNS)
+                break
+        updated_row = row.copy()
+        for name, value in zip(STATIC_COLUMNS, row_values):
+            updated_row[name] = value
+        updated_rows.append(updated_row)
+    return pd.DataFrame(updated_rows)
+
+
+def make_catalogue(rng, size, schemas, tables, columns):
+    return pd.DataFrame({
+        'Table Name': [rng.choice(tables) for _ in range(size)],
+        'Schema Name': [rng.choice(schemas) for _ in range(size)],
+        'Column Name': [rng.choice(columns) for _ in range(size)],
+        **{name: [rng.choice(['Y', 'N', 'High', 'Low']) for _ in range(size)] for name in STATIC_COLUMNS},
+    })
+
+
+def make_lineage(rng, size, schemas, tables, columns):
+    return pd.DataFrame({
+        'Starting Line': range(1, size + 1),
+        'Schema': [rng.choice(schemas).upper() for _ in range(size)],
+        'Table': [rng.choice(tables) for _ in range(size)],
+        'Columns': [", ".join(rng.sample(columns, 6)) for _ in range(size)],
+    })
+
+
+def make_pattern_rules(rng, size, columns):
+    # Wildcards on column-name fragments, some narrowed to a schema, plus a few regex rules
+    rules = []
+    for number in range(size):
+        fragment = rng.choice(columns)[len('column_'):]
+        if number % 10 == 0:
+            rules.append(('*', '*', f"re:column_{fragment}(_old)?"))
+        elif number % 3 == 0:
+            rules.append((f"schema_{rng.randrange(20)}", '*', f"*_{fragment}"))
+        else:
+            rules.append(('*', 'table_?', f"column_{fragment}*"))
+    return [(schema, table, column, ('High',) * len(STATIC_COLUMNS)) for schema, table, column in rules]
+
+
+def rule_by_rule(rules, names):
+    # Every rule compiled on its own and tried in turn, first match wins
+    compiled = [re.compile(f"{field_regex(schema)}\n{field_regex(table)}\n{field_regex(column)}", re.IGNORECASE)
+                for schema, table, column, _ in rules]
+    return [next((rule[3] for rule, regex in zip(rules, compiled)
+                  if regex.fullmatch(f"{schema}\n{table}\n{column}")), None) for schema, table, column in names]
+
+
+def timed(func, *args):
+    # The functions print progress; keep it out of the timing table
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--catalogue-size', type=int, default=250000)
+    parser.add_argument('--legacy-sample', type=int, default=200,
+                        help='Rows timed through the old loop; its full-size time is extrapolated')
+    parser.add_argument('--pattern-rules', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--pattern-names', type=int, default=20000, help='Distinct names classified by pattern rules')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    schemas = [f"schema_{i}" for i in range(20)] + ['N/A']
+    tables = [f"table_{i}" for i in range(500)]
+    columns = [f"column_{i}" for i in range(2000)]
+    catalogue = make_catalogue(rng, args.catalogue_size, schemas, tables, columns)
+
+    print(f"{'rows':>10}{'indexed s':>12}{'rows/s':>12}{'legacy s (est.)':>18}{'speedup':>10}")
+    for size in args.rows:
+        lineage = make_lineage(rng, size, schemas, tables, columns)
+        indexed_time, indexed = timed(add_static_columns, lineage, catalogue)
+
+        sample = lineage.head(args.legacy_sample)
+        legacy_time, legacy = timed(legacy_add_static_columns, sample, catalogue)
+        # Both paths must classify the sample identically
+        assert legacy[STATIC_COLUMNS].values.tolist() == indexed.head(len(sample))[STATIC_COLUMNS].values.tolist()
+        legacy_estimate = legacy_time * size / len(sample)
+
+        print(f"{size:>10}{indexed_time:>12.2f}{size / indexed_time:>12.0f}{legacy_estimate:>18.1f}"
+              f"{legacy_estimate / indexed_time:>9.0f}x")
+
+    print()
+    print(f"{'pattern rules':>14}{'names':>10}{'combined s':>12}{'names/s':>12}{'rule-by-rule s':>16}{'speedup':>10}")
+    names = [(rng.choice(schemas), rng.choice(tables), rng.choice(columns)) for _ in range(args.pattern_names)]
+    for size in args.pattern_rules:
+        rules = make_pattern_rules(rng, size, columns)
+        start = time.perf_counter()
+        matcher = RuleMatcher(rules)
+        # No memo hits: every name is distinct work for both paths
+        combined = [matcher.match_pattern(*name) for name in dict.fromkeys(names)]
+        combined_time = time.perf_counter() - start
+        sample = list(dict.fromkeys(names))[:args.legacy_sample]
+        by_rule_time, by_rule = timed(rule_by_rule, rules, sample)
+        assert by_rule == combined[:len(sample)]
+        by_rule_estimate = by_rule_time * len(combined) / len(sample)
+        print(f"{size:>14}{len(combined):>10}{combined_time:>12.2f}{len(combined) / combined_time:>12.0f}"
+              f"{by_rule_estimate:>16.1f}{by_rule_estimate / combined_time:>9.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""Reproducible synthetic SQL corpora for the lineage benchmarks.
+
+    python -m benchmarks.corpus /tmp/corpus --profile deep-joins
+"""
+import argparse
+import os
+import random
+from dataclasses import dataclass
+
+SCHEMAS = ['hr', 'sales', 'finance', 'staging', 'dw']
+TABLES = ['employees', 'departments', 'orders', 'order_lines', 'customers', 'invoices', 'payments', 'regions',
+          'products', 'shipments', 'accounts', 'ledger']
+COLUMNS = ['id', 'customer_id', 'order_id', 'region_id', 'amount', 'status', 'created_at', 'updated_at', 'name',
+           'description', 'currency', 'quantity', 'unit_price', 'join_key', 'from_date', 'to_date', 'version']
+
+
+@dataclass
+class CorpusSpec:
+    files: int
+    statements_per_file: int
+    columns: int  # Select-list length, the main driver of statement length
+    join_depth: int
+    alias_ratio: float  # Share of tables referenced through an alias rather than their name
+    comment_ratio: float  # Chance of a comment (some holding ';') before each clause
+    cte_ratio: float  # Share of statements wrapped in a WITH ... AS (...) CTE
+
+
+PROFILES = {
+    'many-small-files': CorpusSpec(files=2000, statements_per_file=2, columns=6, join_depth=1,
+                                   alias_ratio=0.8, comment_ratio=0.2, cte_ratio=0.0),
+    'wide-statements': CorpusSpec(files=50, statements_per_file=20, columns=150, join_depth=3,
+                                  alias_ratio=0.9, comment_ratio=0.1, cte_ratio=0.1),
+    'deep-joins': CorpusSpec(files=100, statements_per_file=10, columns=20, join_depth=12,
+                             alias_ratio=1.0, comment_ratio=0.1, cte_ratio=0.0),
+    'cte-heavy': CorpusSpec(files=200, statements_per_file=10, columns=15, join_depth=3,
+                            alias_ratio=0.7, comment_ratio=0.3, cte_ratio=0.8),
+    'unaliased': CorpusSpec(files=200, statements_per_file=10, columns=15, join_depth=4,
+                            alias_ratio=0.0, comment_ratio=0.0, cte_ratio=0.0),
+}
+
+
+def _comment(rng, spec):
+    if rng.random() >= spec.comment_ratio:
+        return ""
+    if rng.random() < 0.5:
+        return f"-- step {rng.randrange(100)}; checked by etl\n"
+    return f"/* owner: team_{rng.randrange(10)}; reviewed */\n"
+
+
+def _select(rng, spec, table_refs, indent=""):
+    # table_refs: [(schema.table, qualifier)] where the qualifier is the alias or the table name
+    items = []
+    for position in range(spec.columns):
+        qualifier = rng.choice(table_refs)[1]
+        column = f"{qualifier}.{rng.choice(COLUMNS)}"
+        if position % 7 == 3:
+            column = f"UPPER({column}) AS {rng.choice(COLUMNS)}_{position}"
+        items.append(column)
+    return f"{indent}SELECT\n{indent}    " + f",\n{indent}    ".join(items)
+
+
+def _from_clause(rng, spec, table_refs, indent=""):
+    lines = []
+    for position, (name, qualifier) in enumerate(table_refs):
+        reference = name if qualifier == name.split('.')[-1] else f"{name} {qualifier}"
+        if position == 0:
+            lines.append(f"{indent}FROM {reference}")
+        else:
+            previous = table_refs[rng.randrange(position)][1]
+            join = rng.choice(['JOIN', 'LEFT JOIN', 'INNER JOIN'])
+            lines.append(f"{indent}{join} {reference} ON {previous}.id = {qualifier}.{rng.choice(COLUMNS)}")
+    return "\n".join(lines)
+
+
+def _table_refs(rng, spec):
+    refs = []
+    used = set()
+    for position in range(spec.join_depth + 1):
+        name = f"{rng.choice(SCHEMAS)}.{rng.choice(TABLES)}"
+        table = name.split('.')[-1]
+        if rng.random() < spec.alias_ratio or table in used:
+            qualifier = f"t{position}"
+        else:
+            qualifier = table
+        used.add(table)
+        refs.append((name, qualifier))
+    return refs
+
+
+def statement(rng, spec):
+    table_refs = _table_refs(rng, spec)
+    where = f"WHERE {table_refs[0][1]}.status = 'open;pending'"
+    if rng.random() < spec.cte_ratio:
+        inner_refs = _table_refs(rng, spec)
+        cte = (f"WITH recent AS (\n{_select(rng, spec, inner_refs, '    ')}\n"
+               f"{_from_clause(rng, spec, inner_refs, '    ')}\n)\n")
+        table_refs = table_refs + [('recent', 'recent')]
+    else:
+        cte = ""
+    return (_comment(rng, spec) + cte + _select(rng, spec, table_refs) + "\n" + _comment(rng, spec)
+            + _from_clause(rng, spec, table_refs) + "\n" + where + ";\n\n")
+
+
+def generate_corpus(folder, spec, seed=0):
+    # Same spec and seed, same bytes; returns the written file paths
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    file_paths = []
+    for index in range(spec.files):
+        path = os.path.join(folder, f"job_{index:05d}.sql")
+        with open(path, 'w', encoding='utf-8') as f:
+            for _ in range(spec.statements_per_file):
+                f.write(statement(rng, spec))
+        file_paths.append(path)
+    return file_paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('folder')
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='deep-joins')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    file_paths = generate_corpus(args.folder, PROFILES[args.profile], args.seed)
+    size_mb = sum(os.path.getsize(path) for path in file_paths) / (1024 * 1024)
+    print(f"Wrote {len(file_paths)} files ({size_mb:.1f} MB) to {args.folder}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import numpy
+from numpy.lib.stride_tricks import as_strided
+
+# Character windows for the text LSTM in nlp_ud1.py. The text is encoded once as uint8 character indexes;
+# the (samples, seq_length) training windows are a read-only strided view of that array, so memory grows
+# with the text length rather than text length x seq_length. Works under Python 2 and 3.
+
+
+class CharDataset(object):
+    """A text as uint8 character indexes, with every seq_length window and the character that follows it."""
+
+    def __init__(self, text, seq_length=100):
+        self.chars = sorted(set(text))
+        if len(self.chars) > 256:
+            raise ValueError("%d distinct characters do not fit in uint8" % len(self.chars))
+        self.char_to_int = dict((c, i) for i, c in enumerate(self.chars))
+        self.int_to_char = dict((i, c) for i, c in enumerate(self.chars))
+        self.n_vocab = len(self.chars)
+        self.seq_length = seq_length
+        # One vectorized lookup from code points to indexes; chars is sorted, so searchsorted finds each one
+        if isinstance(text, bytes):
+            code_points = numpy.frombuffer(text, dtype=numpy.uint8)
+        else:
+            code_points = numpy.frombuffer(text.encode('utf-32-le'), dtype=numpy.uint32)
+        vocab = numpy.array([ord(c) for c in self.chars], dtype=code_points.dtype)
+        self.encoded = numpy.searchsorted(vocab, code_points).astype(numpy.uint8)
+        self.n_chars = len(self.encoded)
+        self.n_patterns = max(0, self.n_chars - seq_length)
+
+    def windows(self):
+        # Window i is encoded[i:i + seq_length]; rows share memory with encoded, so the view is read-only
+        step = self.encoded.strides[0]
+        view = as_strided(self.encoded, shape=(self.n_patterns, self.seq_length), strides=(step, step))
+        view.flags.writeable = False
+        return view
+
+    def targets(self):
+        # The character after each window
+        return self.encoded[self.seq_length:]
+
+    def inputs(self, indexes):
+        # Model input for the given windows: float32 [samples, time steps, features], normalized by n_vocab
+        return (self.windows()[indexes] / numpy.float32(self.n_vocab)).astype(numpy.float32)[:, :, None]
+
+    def one_hot(self, indexes, n_classes=None):
+        targets = self.targets()[indexes]
+        y = numpy.zeros((len(targets), n_classes or self.n_vocab), dtype=numpy.float32)
+        y[numpy.arange(len(targets)), targets] = 1.0
+        return y
+
+    def steps_per_epoch(self, batch_size):
+        return -(-self.n_patterns // batch_size)
+
+    def batches(self, batch_size=128, shuffle=True, seed=None, n_classes=None):
+        # Endless (X, y) batches for fit_generator, normalized and one-hot encoded as each batch is taken;
+        # only one batch of floats exists at a time
+        random = numpy.random.RandomState(seed)
+        while True:
+            order = random.permutation(self.n_patterns) if shuffle else numpy.arange(self.n_patterns)
+            for start in range(0, self.n_patterns, batch_size):
+                indexes = order[start:start + batch_size]
+                yield self.inputs(indexes), self.one_hot(indexes, n_classes)
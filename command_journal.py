@@ -0,0 +1,150 @@
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def load_key(path):
+    # Secret for command_hash, created on first use; commands carry personal data, so a plain digest of one
+    # could be confirmed by hashing guesses. The key is linked into place whole, so no reader sees it half written.
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+    temp_path = f"{path}.{os.getpid()}.{secrets.token_hex(4)}.tmp"
+    fd = os.open(temp_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(secrets.token_bytes(32))
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.link(temp_path, path)
+        except FileExistsError:
+            pass  # Another runner created it first; use theirs
+    finally:
+        os.unlink(temp_path)
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def command_hash(command, key):
+    return hmac.new(key, command.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+class CommandJournal:
+    """Append-only record of finished commands, so a restarted run only redoes failed or missing work.
+
+    Each finished command appends one JSON line (command hash, exit code, output location) and the file is
+    fsync'd before the record counts, so a run killed at any point loses at most the command in progress.
+    The latest record for a hash wins; compact() rewrites the file with only those. Hashes are keyed with
+    the secret in key_path (default <path>.key), so journals are only comparable with the same key file.
+    """
+
+    def __init__(self, path, key_path=None):
+        self.path = path
+        self.key = load_key(key_path or f"{path}.key")
+        self.entries = {}  # command hash -> latest record
+        self.others = {}  # the same, read from other runners' journals
+        self.lines = 0
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            self.lines = self._read(path, self.entries)
+        # Superseded records (retries, reruns) are dropped once they make up most of the file
+        if self.lines > 2 * len(self.entries) + 1000:
+            self.compact()
+        self.file = open(path, 'a', encoding='utf-8')
+        # Start new records on a line of their own after a torn last line
+        if self.file.tell() > 0:
+            with open(path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    self.file.write('\n')
+
+    def load_other(self, path):
+        # Another runner's journal, consulted by completed() but never written or compacted here.
+        # Loading it again picks up what that runner has recorded since.
+        others = {}
+        self._read(path, others)
+        with self.lock:
+            for key, record in others.items():
+                # Several runners may have run the same command; keep the latest
+                if key not in self.others or record['time'] >= self.others[key]['time']:
+                    self.others[key] = record
+
+    def _read(self, path, entries):
+        # Returns the number of lines read
+        lines = 0
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                lines += 1
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A run killed mid-write leaves a torn last line
+                    logger.warning("Ignoring unreadable journal line %d in %s", lines, path)
+                    continue
+                entries[record['hash']] = record
+        return lines
+
+    def completed(self, command, output=None):
+        # Finished with exit code 0, and, when an output location is given, wrote it there and it still exists
+        key = command_hash(command, self.key)
+        records = [record for record in (self.entries.get(key), self.others.get(key)) if record is not None]
+        record = max(records, key=lambda record: record['time']) if records else None
+        if record is None or record['exit'] != 0:
+            return False
+        if output is not None:
+            return record['output'] == output and os.path.exists(output)
+        return True
+
+    def record(self, command, returncode, output=None):
+        # returncode is None for a command that was killed or never finished
+        record = {'hash': command_hash(command, self.key), 'exit': returncode, 'output': output,
+                  'time': round(time.time(), 3)}
+        line = json.dumps(record) + '\n'
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.entries[record['hash']] = record
+            self.lines += 1
+
+    def compact(self):
+        # Rewrite with the latest record per command; the rename is atomic, so a crash keeps one whole journal
+        with self.lock:
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                for record in self.entries.values():
+                    f.write(json.dumps(record) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            reopen = getattr(self, 'file', None) is not None and not self.file.closed
+            if reopen:
+                self.file.close()
+            os.replace(temp_path, self.path)
+            directory = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+            try:
+                os.fsync(directory)
+            finally:
+                os.close(directory)
+            logger.info("Compacted journal %s from %d to %d records", self.path, self.lines, len(self.entries))
+            self.lines = len(self.entries)
+            if reopen:
+                self.file = open(self.path, 'a', encoding='utf-8')
+
+    def summary(self):
+        failed = sum(1 for record in self.entries.values() if record['exit'] != 0)
+        return f"{len(self.entries) - failed} commands completed, {failed} failed"
+
+    def close(self, compact=True):
+        if compact and self.lines > len(self.entries):
+            self.compact()
+        self.file.close()
@@ -0,0 +1,161 @@
+import argparse
+import json
+import os
+import subprocess
+import threading
+import time
+
+# Percentiles in the run summary
+PERCENTILES = [50, 95, 99]
+
+
+class MeasuredPopen(subprocess.Popen):
+    """Popen that keeps the resource usage of the process it reaps (POSIX only).
+
+    wait() and poll() reap the child with os.wait4 and set returncode, so Popen finds it already reaped.
+    wait4 reports the child's CPU time and peak RSS including its own waited-for children, so a
+    `shell=True` command is measured as the shell plus what it ran.
+    """
+
+    rusage = None
+
+    def __init__(self, *args, **kwargs):
+        self.reap_lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    def _reap(self, flags):
+        # False only while the child is still running; a child reaped elsewhere is left to Popen, without usage
+        with self.reap_lock:
+            if self.returncode is not None:
+                return True
+            try:
+                pid, status, rusage = os.wait4(self.pid, flags)
+            except ChildProcessError:
+                return True
+            if pid != self.pid:
+                return False
+            self.rusage = rusage
+            self.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+            return True
+
+    def poll(self):
+        self._reap(os.WNOHANG)
+        return super().poll()
+
+    def wait(self, timeout=None):
+        if timeout is None:
+            self._reap(0)
+            return super().wait()
+        # Poll with a growing delay, as Popen.wait does with a timeout
+        deadline = time.monotonic() + timeout
+        delay = 0.0005
+        while not self._reap(os.WNOHANG):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise subprocess.TimeoutExpired(self.args, timeout)
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.05)
+        return super().wait(timeout)
+
+    def usage(self):
+        # CPU seconds (user + system) and peak RSS in MB; ru_maxrss is in kilobytes on Linux
+        if self.rusage is None:
+            return {'cpu_seconds': None, 'peak_rss_mb': None}
+        return {'cpu_seconds': round(self.rusage.ru_utime + self.rusage.ru_stime, 4),
+                'peak_rss_mb': round(self.rusage.ru_maxrss / 1024, 1)}
+
+
+def percentile(sorted_values, percent):
+    # Nearest-rank percentile of an ascending list
+    rank = max(1, -(-len(sorted_values) * percent // 100))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class CommandMetrics:
+    """Appends one JSON line per finished command: wall and CPU time, peak RSS, exit code and output size."""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, 'a', encoding='utf-8')
+        self.records = []  # this run's records, for the summary
+        self.lock = threading.Lock()
+
+    def record(self, name, wall_seconds, returncode, output_bytes, usage, **extra):
+        # name identifies the command in the summary; usage comes from MeasuredPopen.usage()
+        record = {'name': name, 'finished': round(time.time(), 3), 'wall_seconds': round(wall_seconds, 4),
+                  **usage, 'exit': returncode, 'output_bytes': output_bytes, **extra}
+        with self.lock:
+            self.file.write(json.dumps(record) + '\n')
+            self.file.flush()
+            self.records.append(record)
+
+    def close(self):
+        self.file.close()
+
+
+def summarize(records, slowest=10):
+    # Latency percentiles, totals and the slowest commands of a run
+    if not records:
+        return {'commands': 0}
+    wall = sorted(record['wall_seconds'] for record in records)
+    rss = [record['peak_rss_mb'] for record in records if record.get('peak_rss_mb') is not None]
+    cpu = [record['cpu_seconds'] for record in records if record.get('cpu_seconds') is not None]
+    return {
+        'commands': len(records),
+        'failed': sum(1 for record in records if record['exit'] != 0),
+        'wall_seconds': {f"p{percent}": percentile(wall, percent) for percent in PERCENTILES},
+        'total_wall_seconds': round(sum(wall), 3),
+        'total_cpu_seconds': round(sum(cpu), 3),
+        'max_peak_rss_mb': max(rss) if rss else None,
+        'output_bytes': sum(record['output_bytes'] or 0 for record in records),
+        'slowest': sorted(records, key=lambda record: record['wall_seconds'], reverse=True)[:slowest],
+    }
+
+
+def format_summary(summary):
+    if not summary['commands']:
+        return ["No commands measured"]
+    latencies = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in summary['wall_seconds'].items())
+    lines = [
+        f"{summary['commands']} commands ({summary['failed']} failed): {latencies}; "
+        f"{summary['total_wall_seconds']:.1f}s wall, {summary['total_cpu_seconds']:.1f}s CPU in total, "
+        f"peak RSS {summary['max_peak_rss_mb']} MB, {summary['output_bytes']} output bytes",
+        f"Slowest {len(summary['slowest'])}:",
+    ]
+    for record in summary['slowest']:
+        lines.append(f"  {record['wall_seconds']:>9.2f}s  cpu {record['cpu_seconds']}s  rss {record['peak_rss_mb']} MB"
+                     f"  exit {record['exit']}  {record['name']}")
+    return lines
+
+
+def load_records(paths):
+    records = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize command metrics files written by the runners")
+    parser.add_argument('metrics_files', nargs='+', help='One or more files, e.g. one per pod')
+    parser.add_argument('--slowest', type=int, default=10)
+    parser.add_argument('--json', action='store_true', help='Print the summary as JSON')
+    args = parser.parse_args()
+
+    summary = summarize(load_records(args.metrics_files), args.slowest)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print("\n".join(format_summary(summary)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from sql_cache import cache_key
+from stage_profile import PROFILE
+
+
+def chunk_by_size(file_paths, workers, chunks_per_worker=4):
+    # Group neighbouring files into chunks of roughly equal byte size, so thousands of tiny files
+    # travel to a worker together while a handful of huge files still spread across the pool
+    sizes = [os.path.getsize(path) for path in file_paths]
+    target_size = max(sum(sizes) // (workers * chunks_per_worker), 1)
+
+    chunks = []
+    current_chunk = []
+    current_size = 0
+    for path, size in zip(file_paths, sizes):
+        current_chunk.append(path)
+        current_size += size
+        if current_size >= target_size:
+            chunks.append(current_chunk)
+            current_chunk = []
+            current_size = 0
+    if current_chunk:
+        chunks.append(current_chunk)
+
+    return chunks
+
+
+def _run_chunk(func, chunk):
+    # Runs in a worker process; the profile of this chunk goes back with its results
+    PROFILE.reset()
+    return [func(path) for path in chunk], PROFILE.snapshot()
+
+
+def map_files(func, file_paths, workers=1, cache=None):
+    # Apply func to every file and return the results in the order of file_paths,
+    # whether the work ran serially or across a process pool.
+    # With a sql_cache.ResultCache, only files whose content changed are handed to func.
+    file_paths = list(file_paths)
+    if cache is not None:
+        return _map_files_cached(func, file_paths, workers, cache)
+    if workers <= 1 or len(file_paths) <= 1:
+        return [func(path) for path in file_paths]
+
+    chunks = chunk_by_size(file_paths, workers)
+    results = []
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+        # executor.map yields chunk results in submission order, which keeps the merge deterministic
+        for chunk_results, chunk_profile in executor.map(partial(_run_chunk, func), chunks):
+            results.extend(chunk_results)
+            PROFILE.merge(chunk_profile)
+
+    return results
+
+
+def _map_files_cached(func, file_paths, workers, cache):
+    keys = [cache_key(path) for path in file_paths]
+    results = [None] * len(file_paths)
+    missing = []
+    for index, key in enumerate(keys):
+        found, result = cache.get(key)
+        if found:
+            results[index] = result
+        else:
+            missing.append(index)
+
+    parsed = map_files(func, [file_paths[index] for index in missing], workers)
+    for index, result in zip(missing, parsed):
+        cache.put(keys[index], result)
+        results[index] = result
+
+    # Eviction lists the whole cache directory, so it only follows a run that parsed something;
+    # entries for deleted files wait until then
+    if missing:
+        cache.evict_stale()
+    return results
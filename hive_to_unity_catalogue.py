@@ -1,13 +1,39 @@
+import csv
 import os
+import signal
 import subprocess
-import pandas as pd
+import threading
+import time
 import logging
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from command_journal import CommandJournal
+from command_metrics import CommandMetrics, MeasuredPopen, format_summary, summarize
+from report_worker import ReportWorker
+
+try:
+    import pyarrow
+    import pyarrow.csv
+    import pyarrow.parquet
+except ImportError:  # Parquet output is optional
+    pyarrow = None
 
 # Configuration
 input_file = "input.txt"  # Change this to your actual input file
 output_folder = "executed_outputs"
-merged_output_file = "merged_output.csv"
+merged_output_file = "merged_output.csv"  # A .parquet name writes Parquet instead (needs pyarrow)
 commands_log_file = "executed_commands.txt"
+workers = 1  # Commands run at the same time; report.py mostly waits on I/O, so this can exceed the CPU count
+command_timeout = None  # Seconds before a command is killed; None waits indefinitely
+max_attempts = 1  # Runs per command, counting retries after a timeout or non-zero exit
+retry_delay = 5  # Seconds before the first retry; doubled for each further retry
+execution_mode = "shell"  # "shell": a new `python report.py` per line; "worker": long-lived report.py processes
+report_script = "report.py"
+journal_file = "executed_commands.journal"  # Finished commands, so a restarted run skips them; None disables it
+# The journal stores keyed hashes of the commands, not the SSNs in them; the key is kept in <journal_file>.key
+metrics_file = "command_metrics.jsonl"  # Time, CPU, peak RSS, exit code and output size per command; None disables it
+slowest_commands = 10  # Commands listed in the end-of-run summary
 os.makedirs(output_folder, exist_ok=True)
 
 # Setup logging
@@ -17,13 +43,185 @@ logging.basicConfig(
     format="%(asctime)s - %(levelname)s - %(message)s"
 )
 
+
+def execute(command):
+    # The command runs in its own process group so a timeout kills report.py too, not just the shell
+    process = MeasuredPopen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                            start_new_session=True)
+    try:
+        stdout, stderr = process.communicate(timeout=command_timeout)
+    except subprocess.TimeoutExpired:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        stdout, stderr = process.communicate()
+        return stdout, stderr, None, process.usage()
+    return stdout, stderr, process.returncode, process.usage()
+
+
+# Worker mode: each pool thread keeps one worker process, which has report.py's imports loaded after its first job
+worker_slot = threading.local()
+report_workers = []
+report_workers_lock = threading.Lock()
+
+
+def execute_in_worker(argv):
+    # Arguments go to the worker as a list, so no shell ever parses an SSN or a date
+    worker = getattr(worker_slot, "worker", None)
+    if worker is None or not worker.alive():
+        worker = worker_slot.worker = ReportWorker(report_script)
+        with report_workers_lock:
+            report_workers.append(worker)
+    return worker.run(argv, command_timeout)
+
+
+def run_command(index, command, argv):
+    # Run one input line's command, retrying timeouts and failures, and save its output as output_{line}.csv
+    output_file = os.path.join(output_folder, f"output_{index + 1}.csv")
+    if journal and journal.completed(command, output_file):
+        logging.info(f"Skipping line {index + 1}: completed by an earlier run")
+        return
+    logging.info(f"Executing: {command}")
+    try:
+        for attempt in range(1, max_attempts + 1):
+            started = time.perf_counter()
+            if execution_mode == "worker":
+                stdout, stderr, returncode, usage = execute_in_worker(argv)
+            else:
+                stdout, stderr, returncode, usage = execute(command)
+            if metrics:
+                # Lines, not command text, name the records: the commands carry SSNs
+                metrics.record(f"line {index + 1}", time.perf_counter() - started, returncode,
+                               len(stdout.encode()), usage, attempt=attempt)
+            if returncode == 0:
+                break
+            reason = f"timed out after {command_timeout}s" if returncode is None else f"exited with {returncode}"
+            if attempt < max_attempts:
+                logging.warning(f"Command for line {index + 1} {reason}; retry {attempt} of {max_attempts - 1}")
+                time.sleep(retry_delay * 2 ** (attempt - 1))
+            elif max_attempts > 1 or returncode is None:
+                logging.error(f"Command for line {index + 1} {reason} after {attempt} attempt(s)")
+
+        with open(output_file, "w") as out_file:
+            out_file.write(stdout)
+            if journal:
+                # The output is on disk before the journal says it is
+                out_file.flush()
+                os.fsync(out_file.fileno())
+
+        if stderr:
+            logging.warning(f"Command stderr for line {index + 1}: {stderr}")
+
+        if journal:
+            journal.record(command, returncode, output_file)
+
+    except Exception as e:
+        logging.error(f"Error executing command for line {index + 1}: {e}")
+
+
+class CsvMerger:
+    """Appends each command's CSV output to the merged file in input order, as soon as it can."""
+
+    def __init__(self, merged_output_file):
+        self.merged_output_file = merged_output_file
+        self.parquet = merged_output_file.endswith(".parquet")
+        if self.parquet and pyarrow is None:
+            raise RuntimeError("Parquet output needs pyarrow (pip install pyarrow)")
+        self.header = None  # columns of the first merged output; later outputs must have the same ones
+        self.out = None
+        self.expected = deque()  # input line indexes in the order their commands were submitted
+        self.finished = set()  # finished commands still waiting for an earlier line
+        self.merged = 0
+
+    def expect(self, index):
+        self.expected.append(index)
+
+    def finish(self, index):
+        # Outputs are appended as soon as every earlier line's command has finished too
+        self.finished.add(index)
+        while self.expected and self.expected[0] in self.finished:
+            index = self.expected.popleft()
+            self.finished.discard(index)
+            self.append(os.path.join(output_folder, f"output_{index + 1}.csv"))
+
+    def append(self, file):
+        try:
+            with open(file, newline="") as in_file:
+                header_line = in_file.readline()
+                header_end = in_file.tell()  # an opaque text-file position, valid whatever the encoding
+                if not header_line.strip() or not in_file.readline():
+                    logging.info(f"Skipping empty output {file}")
+                    return
+                columns = next(csv.reader([header_line]))
+                if self.header is None:
+                    self.open(columns)
+                elif columns != self.header and sorted(columns) != sorted(self.header):
+                    logging.warning(f"Skipping file {file}: columns {columns} do not match {self.header}")
+                    return
+
+                if self.parquet:
+                    self.append_parquet(file, columns)
+                elif columns == self.header:
+                    # Same columns in the same order: copy the rows through in blocks
+                    in_file.seek(header_end)
+                    last = "\n"
+                    for block in iter(lambda: in_file.read(1 << 20), ""):
+                        self.out.write(block)
+                        last = block[-1]
+                    if last != "\n":
+                        self.out.write("\n")
+                else:
+                    # Same columns in another order: rewrite row by row in the merged file's order
+                    in_file.seek(0)
+                    writer = csv.writer(self.out, lineterminator="\n")
+                    for row in csv.DictReader(in_file):
+                        writer.writerow([row[column] for column in self.header])
+            self.merged += 1
+        except Exception as e:
+            logging.warning(f"Skipping file {file} due to read error: {e}")
+
+    def open(self, columns):
+        self.header = columns
+        if self.parquet:
+            # Every column is kept as text, so the schema cannot drift between outputs
+            self.schema = pyarrow.schema([(column, pyarrow.string()) for column in columns])
+            self.out = pyarrow.parquet.ParquetWriter(self.merged_output_file, self.schema)
+        else:
+            self.out = open(self.merged_output_file, "w", newline="")
+            csv.writer(self.out, lineterminator="\n").writerow(columns)
+
+    def append_parquet(self, file, columns):
+        convert_options = pyarrow.csv.ConvertOptions(column_types={column: pyarrow.string() for column in columns})
+        reader = pyarrow.csv.open_csv(file, convert_options=convert_options)
+        for batch in reader:
+            self.out.write_table(pyarrow.Table.from_batches([batch]).select(self.header))
+
+    def close(self):
+        if self.out is not None:
+            self.out.close()
+            logging.info(f"Merged {self.merged} outputs into {self.merged_output_file}")
+        else:
+            logging.warning("No valid CSV files found for merging.")
+
+
 try:
     # Read the input file
     with open(input_file, "r") as file:
         lines = file.readlines()
     
+    # Outputs are merged into a single CSV with a single header while the commands run
+    merger = CsvMerger(merged_output_file)
+
+    # Lines a killed run already finished are skipped; failed and missing ones run again
+    journal = CommandJournal(journal_file) if journal_file else None
+    metrics = CommandMetrics(metrics_file) if metrics_file else None
+
     # Save all commands to a file
-    with open(commands_log_file, "w") as cmd_log:
+    with open(commands_log_file, "w") as cmd_log, ThreadPoolExecutor(max_workers=workers) as executor:
+        # At most two commands per worker are queued, so a 20k-line input is not submitted all at once
+        pending = {}  # future -> input line index
+
         # Process each line
         for index, line in enumerate(lines):
             parts = line.strip().split(",")  # Assuming CSV format
@@ -38,47 +236,43 @@ try:
                 f"-begin_date='{begin_date}' -end_date='{end_date}'"
             )
             
+            # The same arguments as data, for worker mode
+            argv = ["-job_name=hist", f"-case_number={case_number}", f"-ssn={ssn}",
+                    f"-begin_date={begin_date}", f"-end_date={end_date}"]
+            
             # Write command to log file
             cmd_log.write(command + "\n")
             
-            # Define output file
-            output_file = os.path.join(output_folder, f"output_{index + 1}.csv")
-            
-            # Execute the command and save output
-            logging.info(f"Executing: {command}")
-            try:
-                result = subprocess.run(command, shell=True, capture_output=True, text=True)
-                with open(output_file, "w") as out_file:
-                    out_file.write(result.stdout)
-                
-                if result.stderr:
-                    logging.warning(f"Command stderr for line {index + 1}: {result.stderr}")
-                    
-            except Exception as e:
-                logging.error(f"Error executing command for line {index + 1}: {e}")
-
-    # Merge all CSV files into a single CSV with a single header
-    csv_files = [os.path.join(output_folder, f) for f in os.listdir(output_folder) if f.endswith(".csv")]
-    
-    if csv_files:
-        try:
-            dataframes = []
-            for file in csv_files:
-                try:
-                    df = pd.read_csv(file)
-                    if not df.empty:
-                        dataframes.append(df)
-                except Exception as e:
-                    logging.warning(f"Skipping file {file} due to read error: {e}")
-            
-            if dataframes:
-                merged_df = pd.concat(dataframes, ignore_index=True)
-                merged_df.to_csv(merged_output_file, index=False)
-                logging.info(f"Merged CSV saved as {merged_output_file}")
-            else:
-                logging.warning("No valid CSV files found for merging.")
-        except Exception as e:
-            logging.error(f"Error merging CSV files: {e}")
+            # Execute the command and save output in the worker pool
+            if len(pending) >= 2 * workers:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    merger.finish(pending.pop(future))
+            merger.expect(index)
+            pending[executor.submit(run_command, index, command, argv)] = index
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                merger.finish(pending.pop(future))
+
+    for worker in report_workers:
+        if worker.alive():
+            worker.close()
+
+    if journal:
+        logging.info(f"Journal {journal_file}: {journal.summary()}")
+        journal.close()
+
+    if metrics:
+        for summary_line in format_summary(summarize(metrics.records, slowest_commands)):
+            logging.info(summary_line)
+        metrics.close()
+
+    try:
+        merger.close()
+    except Exception as e:
+        logging.error(f"Error merging CSV files: {e}")
 
 except Exception as e:
     logging.critical(f"Script failed: {e}")
@@ -0,0 +1,145 @@
+import argparse
+import json
+import time
+
+import numpy
+
+# NumPy forward pass for the intent model built in intllj_intents.py: LSTM(32) over (time steps, 1) inputs,
+# then a softmax Dense layer. export_weights needs keras once; IntentEngine needs only numpy, so consumers
+# skip the keras and backend import and compile. Export, then score with the engine:
+#
+#     python intent_numpy.py model.json model.h5 intent_model.npz --dtype float16
+#     python intent_scoring.py intent_test.xls predictions.csv --engine intent_model.npz
+WEIGHT_DTYPES = ('float32', 'float16', 'int8')
+CHUNK_SAMPLES = 512  # Samples per forward pass inside IntentEngine.predict
+
+
+def quantize(weights):
+    # Symmetric int8 with one scale per output column
+    scales = numpy.abs(weights).max(axis=0) / 127.0
+    scales[scales == 0] = 1.0
+    return numpy.round(weights / scales).astype(numpy.int8), scales.astype(numpy.float32)
+
+
+def lstm_weights(layer):
+    """Returns kernel (inputs, 4 * units), recurrent kernel (units, 4 * units) and bias in gate order i, f, c, o."""
+    weights = layer.get_weights()
+    if len(weights) == 3:
+        return weights
+    # Keras 1 keeps one W, U, b per gate, in the order i, c, f, o
+    (W_i, U_i, b_i, W_c, U_c, b_c, W_f, U_f, b_f, W_o, U_o, b_o) = weights
+    return (numpy.concatenate([W_i, W_f, W_c, W_o], axis=1), numpy.concatenate([U_i, U_f, U_c, U_o], axis=1),
+            numpy.concatenate([b_i, b_f, b_c, b_o]))
+
+
+def export_weights(model_json, model_weights, output, dtype='float32'):
+    """Writes the LSTM and Dense weights and activations of a saved keras model to a .npz file."""
+    import keras
+    from intent_scoring import load_model
+    if dtype not in WEIGHT_DTYPES:
+        raise ValueError(f"dtype must be one of {WEIGHT_DTYPES}")
+    model = load_model(model_json, model_weights)
+    lstm, dense = [layer for layer in model.layers if type(layer).__name__ in ('LSTM', 'Dense')]
+    config = lstm.get_config()
+    kernel, recurrent_kernel, bias = lstm_weights(lstm)
+    dense_kernel, dense_bias = dense.get_weights()
+    arrays = {'bias': bias.astype(numpy.float32), 'dense_bias': dense_bias.astype(numpy.float32)}
+    for name, weights in (('kernel', kernel), ('recurrent_kernel', recurrent_kernel), ('dense_kernel', dense_kernel)):
+        if dtype == 'int8':
+            arrays[name], arrays[f"{name}_scale"] = quantize(weights)
+        else:
+            arrays[name] = weights.astype(dtype)
+    meta = {
+        'activation': config['activation'],
+        'recurrent_activation': config.get('recurrent_activation', config.get('inner_activation')),
+        'dense_activation': dense.get_config()['activation'],
+        # keras 3 changed hard_sigmoid from 0.2 * x + 0.5 to x / 6 + 0.5
+        'hard_sigmoid_slope': 0.2 if int(keras.__version__.split('.')[0]) < 3 else 1 / 6,
+        'dtype': dtype,
+    }
+    numpy.savez_compressed(output, meta=numpy.array(json.dumps(meta)), **arrays)
+    return meta
+
+
+ACTIVATIONS = {
+    'tanh': numpy.tanh,
+    'sigmoid': lambda x: 0.5 * numpy.tanh(0.5 * x) + 0.5,
+    'relu': lambda x: numpy.maximum(x, 0),
+    'linear': lambda x: x,
+}
+
+
+class IntentEngine:
+    """LSTM + Dense forward pass over float32 weights, dequantized at load when stored as float16 or int8."""
+
+    def __init__(self, path):
+        with numpy.load(path) as arrays:
+            self.meta = json.loads(str(arrays['meta']))
+            weights = {}
+            for name in ('kernel', 'recurrent_kernel', 'dense_kernel'):
+                weights[name] = arrays[name].astype(numpy.float32)
+                if f"{name}_scale" in arrays:
+                    weights[name] *= arrays[f"{name}_scale"]
+            self.units = weights['recurrent_kernel'].shape[0]
+            # i, f, c, o on disk; i, f, o, c in memory
+            order = numpy.r_[0:2 * self.units, 3 * self.units:4 * self.units, 2 * self.units:3 * self.units]
+            self.kernel = numpy.ascontiguousarray(weights['kernel'][:, order])
+            self.recurrent_kernel = numpy.ascontiguousarray(weights['recurrent_kernel'][:, order])
+            self.bias = arrays['bias'][order]
+            self.dense_kernel = weights['dense_kernel']
+            self.dense_bias = arrays['dense_bias']
+        self.activation = self._activation(self.meta['activation'])
+        self.recurrent_activation = self._activation(self.meta['recurrent_activation'])
+
+    def _activation(self, name):
+        if name == 'hard_sigmoid':
+            slope = self.meta['hard_sigmoid_slope']
+            return lambda x: numpy.clip(slope * x + 0.5, 0.0, 1.0)
+        return ACTIVATIONS[name]
+
+    def predict(self, X, batch_size=None, verbose=0):
+        """Class probabilities for X of shape (samples, time steps, features); the arguments mirror keras."""
+        X = numpy.asarray(X, dtype=numpy.float32)
+        # Chunks keep the gate arrays in cache; batch_size only matters when it is smaller
+        chunk = min(batch_size or CHUNK_SAMPLES, CHUNK_SAMPLES)
+        return numpy.concatenate([self._forward(X[start:start + chunk]) for start in range(0, len(X), chunk)]) \
+            if len(X) else numpy.zeros((0, self.dense_bias.shape[0]), dtype=numpy.float32)
+
+    def _forward(self, X):
+        samples, steps, _ = X.shape
+        units = self.units
+        # Input projections for every time step in one matmul; only the recurrence runs step by step.
+        # Gates are stored i, f, o, c here, so one call covers the three recurrent activations.
+        projected = (X.reshape(samples * steps, -1) @ self.kernel + self.bias).reshape(samples, steps, 4 * units)
+        h = numpy.zeros((samples, units), dtype=numpy.float32)
+        c = numpy.zeros((samples, units), dtype=numpy.float32)
+        for t in range(steps):
+            z = projected[:, t] + h @ self.recurrent_kernel
+            gates = self.recurrent_activation(z[:, :3 * units])
+            c = gates[:, units:2 * units] * c + gates[:, :units] * self.activation(z[:, 3 * units:])
+            h = gates[:, 2 * units:] * self.activation(c)
+        logits = h @ self.dense_kernel + self.dense_bias
+        if self.meta['dense_activation'] != 'softmax':
+            return self._activation(self.meta['dense_activation'])(logits)
+        logits -= logits.max(axis=1, keepdims=True)
+        probabilities = numpy.exp(logits)
+        return probabilities / probabilities.sum(axis=1, keepdims=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exports a saved keras intent model to a NumPy weight file")
+    parser.add_argument('model_json')
+    parser.add_argument('model_weights')
+    parser.add_argument('output', help='.npz file for the weights')
+    parser.add_argument('--dtype', choices=WEIGHT_DTYPES, default='float32',
+                        help='Storage type of the weight matrices; computation is float32 either way')
+    args = parser.parse_args()
+
+    meta = export_weights(args.model_json, args.model_weights, args.output, args.dtype)
+    started = time.perf_counter()
+    IntentEngine(args.output)
+    print(f"Wrote {args.output} ({meta['dtype']}); engine loads in {time.perf_counter() - started:.3f}s")
+
+
+if __name__ == '__main__':
+    main()
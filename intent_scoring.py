@@ -0,0 +1,104 @@
+import argparse
+import time
+
+import numpy
+import pandas as pd
+
+from intent_numpy import IntentEngine
+
+# Alphabet and sequence length the intent model was trained with (see intllj_intents.py)
+ALPHABET = 'ABCDEF'
+MAX_LEN = 5
+BATCH_SIZE = 4096  # Samples per model.predict batch
+
+
+def char_lookup(alphabet=ALPHABET):
+    # Byte value -> index in the alphabet, -1 for characters outside it
+    table = numpy.full(256, -1, dtype=numpy.int16)
+    for i, c in enumerate(alphabet):
+        table[ord(c)] = i
+    return table
+
+
+def encode_sequences(sequences, max_len=MAX_LEN, alphabet=ALPHABET):
+    """Encodes strings to an (n, max_len) int matrix, padded and truncated at the front like pad_sequences."""
+    sequences = [str(sequence) for sequence in sequences]
+    lengths = numpy.fromiter((len(sequence) for sequence in sequences), dtype=numpy.int64, count=len(sequences))
+    # One lookup over all the characters at once instead of a dict lookup per character
+    try:
+        chars = numpy.frombuffer(''.join(sequences).encode('ascii'), dtype=numpy.uint8)
+    except UnicodeEncodeError:
+        chars = None
+    codes = char_lookup(alphabet)[chars] if chars is not None else None
+    if codes is None or (codes < 0).any():
+        row = next(i for i, sequence in enumerate(sequences) if any(c not in alphabet for c in sequence))
+        raise ValueError(f"Row {row}: {sequences[row]!r} has characters outside {alphabet!r}")
+
+    # Row r keeps its last min(length, max_len) characters, right-aligned, with zeros in front
+    ends = numpy.cumsum(lengths)
+    columns = numpy.arange(max_len)
+    kept = numpy.minimum(lengths, max_len)
+    source = ends[:, None] - max_len + columns
+    mask = columns >= (max_len - kept)[:, None]
+    encoded = numpy.zeros((len(sequences), max_len), dtype=numpy.int16)
+    encoded[mask] = codes[source[mask]]
+    return encoded
+
+
+def model_inputs(encoded, scale):
+    # The (samples, time steps, features) float input the LSTM expects, scaled like the training data
+    return (encoded.astype('float32') / float(scale)).reshape(encoded.shape[0], encoded.shape[1], 1)
+
+
+def load_model(model_json='model.json', model_weights='model.h5'):
+    # Inference only, so the model is not compiled; keras is imported here so the encoding helpers work without it
+    from keras.models import model_from_json
+    with open(model_json, 'r') as json_file:
+        model = model_from_json(json_file.read())
+    model.load_weights(model_weights)
+    return model
+
+
+def predict(model, X, batch_size=BATCH_SIZE):
+    """Returns the predicted class index and its probability for every sample in X."""
+    indexes = numpy.empty(X.shape[0], dtype=numpy.int64)
+    confidences = numpy.empty(X.shape[0], dtype='float32')
+    for start in range(0, X.shape[0], batch_size):
+        probabilities = model.predict(X[start:start + batch_size], batch_size=batch_size, verbose=0)
+        indexes[start:start + batch_size] = probabilities.argmax(axis=1)
+        confidences[start:start + batch_size] = probabilities.max(axis=1)
+    return indexes, confidences
+
+
+def score_frame(model, frame, scale=None, batch_size=BATCH_SIZE, max_len=MAX_LEN, alphabet=ALPHABET):
+    # Adds prediction and confidence columns for frame.sequence_in; scale defaults to the row count,
+    # which is what the per-row scripts divided by
+    encoded = encode_sequences(frame.sequence_in, max_len, alphabet)
+    indexes, confidences = predict(model, model_inputs(encoded, scale or len(frame)), batch_size)
+    scored = frame.copy()
+    scored['prediction'] = numpy.array(list(alphabet))[indexes]
+    scored['confidence'] = confidences
+    return scored
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scores every sequence_in of a sheet with the saved intent model")
+    parser.add_argument('input', help='Excel or CSV file with a sequence_in column')
+    parser.add_argument('output', help='CSV file for the predictions')
+    parser.add_argument('--model-json', default='model.json')
+    parser.add_argument('--model-weights', default='model.h5')
+    parser.add_argument('--engine', help='Weight file from intent_numpy.py, scored with NumPy instead of keras')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--scale', type=float, help='Divisor for the encoded inputs; defaults to the row count')
+    args = parser.parse_args()
+
+    frame = pd.read_csv(args.input) if args.input.endswith('.csv') else pd.read_excel(args.input)
+    model = IntentEngine(args.engine) if args.engine else load_model(args.model_json, args.model_weights)
+    started = time.perf_counter()
+    scored = score_frame(model, frame, args.scale, args.batch_size)
+    print(f"Scored {len(scored)} sequences in {time.perf_counter() - started:.2f}s")
+    scored.to_csv(args.output, index=False)
+
+
+if __name__ == '__main__':
+    main()
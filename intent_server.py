@@ -0,0 +1,233 @@
+import argparse
+import json
+import logging
+import os
+import queue
+import socketserver
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy
+
+from command_metrics import percentile
+from intent_numpy import IntentEngine
+from intent_scoring import ALPHABET, MAX_LEN, encode_sequences, load_model, model_inputs
+
+# Keeps a loaded intent model in one long-lived process and answers predictions over localhost HTTP or a
+# Unix socket. Requests that arrive together are scored in one model.predict call:
+#
+#     python intent_server.py --scale 24 --socket /tmp/intent.sock &
+#     curl --unix-socket /tmp/intent.sock -d '{"sequences": ["ABC", "FED"]}' http://localhost/predict
+#     curl --unix-socket /tmp/intent.sock http://localhost/metrics
+logger = logging.getLogger(__name__)
+
+MAX_BATCH = 1024  # Sequences per model.predict call
+MAX_WAIT_MS = 5.0  # How long the first request of a batch waits for others to join it
+RECENT_REQUESTS = 10000  # Latencies kept for the metrics percentiles
+
+
+class Pending:
+    """One request's encoded sequences, waiting for the batch that scores them."""
+
+    def __init__(self, encoded):
+        self.encoded = encoded
+        self.received = time.perf_counter()
+        self.done = threading.Event()
+        self.indexes = None
+        self.confidences = None
+        self.error = None
+
+
+class MicroBatcher:
+    """Collects concurrent requests into batches and runs the model on a single thread."""
+
+    def __init__(self, model, scale, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS):
+        self.model = model
+        self.scale = scale
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.requests = queue.Queue()
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=RECENT_REQUESTS)
+        self.batch_sizes = deque(maxlen=RECENT_REQUESTS)
+        self.counts = {'requests': 0, 'sequences': 0, 'batches': 0, 'errors': 0}
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, encoded):
+        # Blocks until the batch holding these sequences has been scored
+        pending = Pending(encoded)
+        self.requests.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.indexes, pending.confidences
+
+    def _collect(self):
+        # The first request opens a batch; others join until it is full or the deadline passes
+        batch = [self.requests.get()]
+        size = len(batch[0].encoded)
+        deadline = batch[0].received + self.max_wait
+        while size < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                pending = self.requests.get(timeout=timeout)
+            except queue.Empty:
+                break
+            batch.append(pending)
+            size += len(pending.encoded)
+        return batch, size
+
+    def _run(self):
+        while True:
+            batch, size = self._collect()
+            try:
+                encoded = numpy.concatenate([pending.encoded for pending in batch])
+                probabilities = self.model.predict(model_inputs(encoded, self.scale), batch_size=size, verbose=0)
+                indexes = probabilities.argmax(axis=1)
+                confidences = probabilities.max(axis=1)
+                error = None
+            except Exception as e:
+                logger.exception("Batch of %d sequences failed", size)
+                error = e
+            finished = time.perf_counter()
+            start = 0
+            with self.lock:
+                self.counts['batches'] += 1
+                self.counts['sequences'] += size
+                self.batch_sizes.append(size)
+                for pending in batch:
+                    end = start + len(pending.encoded)
+                    if error is None:
+                        pending.indexes, pending.confidences = indexes[start:end], confidences[start:end]
+                    else:
+                        pending.error = error
+                        self.counts['errors'] += 1
+                    start = end
+                    self.counts['requests'] += 1
+                    self.latencies.append(finished - pending.received)
+            for pending in batch:
+                pending.done.set()
+
+    def metrics(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            batch_sizes = sorted(self.batch_sizes)
+            counts = dict(self.counts)
+        summary = dict(counts)
+        if latencies:
+            summary['latency_ms'] = {f"p{percent}": round(percentile(latencies, percent) * 1000, 3)
+                                     for percent in (50, 95, 99)}
+            summary['batch_size'] = {'mean': round(sum(batch_sizes) / len(batch_sizes), 2),
+                                     'p50': percentile(batch_sizes, 50), 'max': batch_sizes[-1]}
+        return summary
+
+
+class IntentHandler(BaseHTTPRequestHandler):
+    """POST /predict with {"sequences": [...]}; GET /metrics and GET /health."""
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+    def _reply(self, status, body):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path == '/metrics':
+            self._reply(200, self.server.batcher.metrics())
+        elif self.path == '/health':
+            self._reply(200, {'status': 'ok'})
+        else:
+            self._reply(404, {'error': f"unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path != '/predict':
+            self._reply(404, {'error': f"unknown path {self.path}"})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            sequences = request['sequences']
+            encoded = encode_sequences(sequences, self.server.max_len, self.server.alphabet)
+        except (ValueError, KeyError, TypeError) as e:
+            self._reply(400, {'error': str(e)})
+            return
+        if not sequences:
+            self._reply(200, {'predictions': [], 'confidences': []})
+            return
+        try:
+            indexes, confidences = self.server.batcher.submit(encoded)
+        except Exception as e:
+            self._reply(500, {'error': str(e)})
+            return
+        self._reply(200, {'predictions': [self.server.alphabet[i] for i in indexes],
+                          'confidences': [round(float(c), 6) for c in confidences]})
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(batcher, socket_path=None, port=8765, max_len=MAX_LEN, alphabet=ALPHABET):
+    # Listens on localhost only; a Unix socket is reachable only through its file permissions
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = UnixHTTPServer(socket_path, IntentHandler)
+    else:
+        server = ThreadingHTTPServer(('127.0.0.1', port), IntentHandler)
+        server.daemon_threads = True
+    server.batcher = batcher
+    server.max_len = max_len
+    server.alphabet = alphabet
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serves intent predictions from a model loaded once")
+    parser.add_argument('--scale', type=float, required=True,
+                        help='Divisor the training inputs were scaled by (the training sheet row count)')
+    parser.add_argument('--model-json', default='model.json')
+    parser.add_argument('--model-weights', default='model.h5')
+    parser.add_argument('--engine', help='Weight file from intent_numpy.py, served with NumPy instead of keras')
+    parser.add_argument('--socket', help='Unix socket path; without it the server listens on localhost')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH)
+    parser.add_argument('--max-wait-ms', type=float, default=MAX_WAIT_MS)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    # CPU only: hide GPUs from the backend before keras is imported
+    os.environ['CUDA_VISIBLE_DEVICES'] = ''
+    os.environ.setdefault('THEANO_FLAGS', 'device=cpu')
+    started = time.perf_counter()
+    model = IntentEngine(args.engine) if args.engine else load_model(args.model_json, args.model_weights)
+    logger.info("Loaded %s in %.2fs", args.engine or args.model_json, time.perf_counter() - started)
+
+    batcher = MicroBatcher(model, args.scale, args.max_batch, args.max_wait_ms)
+    server = make_server(batcher, args.socket, args.port)
+    logger.info("Serving on %s", args.socket or f"http://127.0.0.1:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.unlink(args.socket)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+import logging
+import os
+import socket
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class LeaseQueue:
+    """Batches of a shared command list that runner processes claim through lease files on a shared volume.
+
+    A batch is claimed by creating its lease file with O_CREAT | O_EXCL, which exactly one process can do.
+    Holders keep the lease fresh by touching it; a lease left untouched for lease_seconds belongs to a
+    runner that died or hung, and the batch is reclaimed by creating the lease of the next generation
+    (batch_000012.1 after batch_000012.0), which again exactly one process can do. A reclaimed batch may
+    run twice if its old holder was only slow, so commands should be safe to repeat.
+    """
+
+    def __init__(self, queue_dir, num_commands, batch_size=10, lease_seconds=60, poll_seconds=None, owner=None):
+        self.lease_dir = os.path.join(queue_dir, 'leases')
+        self.done_dir = os.path.join(queue_dir, 'done')
+        os.makedirs(self.lease_dir, exist_ok=True)
+        os.makedirs(self.done_dir, exist_ok=True)
+        self.batch_size = batch_size
+        self.num_batches = -(-num_commands // batch_size)
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds if poll_seconds is not None else min(5.0, lease_seconds / 4)
+        self.owner = owner or f"{socket.gethostname()}-{os.getpid()}"
+        self.held = {}  # batch -> path of the lease this process holds
+        self.reclaimed = {}  # batch -> owner of the expired lease it was reclaimed from
+        self.cursor = 0  # every batch below this one is done
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+        self._heartbeat = threading.Thread(target=self._renew_leases, daemon=True)
+        self._heartbeat.start()
+
+    def _lease_path(self, batch, generation):
+        return os.path.join(self.lease_dir, f"batch_{batch:06d}.{generation}")
+
+    def _done_path(self, batch):
+        return os.path.join(self.done_dir, f"batch_{batch:06d}")
+
+    def batch_range(self, batch):
+        # Indexes of the batch's commands in the command list
+        start = batch * self.batch_size
+        return range(start, start + self.batch_size)
+
+    def _try_lease(self, batch):
+        generation = 0
+        while True:
+            path = self._lease_path(batch, generation)
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            except FileExistsError:
+                try:
+                    expired = time.time() - os.stat(path).st_mtime > self.lease_seconds
+                except FileNotFoundError:
+                    return False
+                if not expired:
+                    return False
+                generation += 1
+                continue
+            with os.fdopen(fd, 'w') as f:
+                f.write(self.owner)
+            self.held[batch] = path
+            if generation:
+                try:
+                    with open(self._lease_path(batch, generation - 1)) as f:
+                        self.reclaimed[batch] = f.read()
+                except FileNotFoundError:
+                    self.reclaimed[batch] = None
+                logger.warning("%s reclaimed batch %d from an expired lease of %s", self.owner, batch,
+                               self.reclaimed[batch])
+            return True
+
+    def claim(self):
+        # Next batch nobody holds, or whose holder stopped renewing its lease; None once every batch is done
+        while True:
+            outstanding = False
+            with self.lock:
+                for batch in range(self.cursor, self.num_batches):
+                    if os.path.exists(self._done_path(batch)):
+                        if batch == self.cursor:
+                            self.cursor += 1
+                        continue
+                    outstanding = True
+                    if batch not in self.held and self._try_lease(batch):
+                        return batch
+            if not outstanding:
+                return None
+            # Only batches leased by other runners are left; wait for them to finish or for a lease to expire
+            time.sleep(self.poll_seconds)
+
+    def reclaimed_from(self, batch):
+        # Owner whose expired lease this process took the batch over from, or None for a fresh claim
+        with self.lock:
+            return self.reclaimed.pop(batch, None)
+
+    def complete(self, batch):
+        with open(self._done_path(batch), 'w') as f:
+            f.write(self.owner)
+        with self.lock:
+            self.held.pop(batch, None)
+
+    def release(self, batch):
+        # Give up a batch without completing it: stop renewing the lease and backdate it, so any runner can
+        # reclaim the batch at once instead of after lease_seconds
+        with self.lock:
+            path = self.held.pop(batch, None)
+        if path is None:
+            return
+        try:
+            os.utime(path, (0, 0))
+        except OSError:
+            logger.warning("%s could not expire its lease on batch %d; it expires in %ss", self.owner, batch,
+                           self.lease_seconds)
+
+    def _renew_leases(self):
+        # Touch held leases well inside lease_seconds; a lease superseded by a newer generation was lost
+        while not self._stop.wait(self.lease_seconds / 3):
+            with self.lock:
+                for batch, path in list(self.held.items()):
+                    generation = int(path.rsplit('.', 1)[1])
+                    if os.path.exists(self._lease_path(batch, generation + 1)):
+                        logger.warning("%s lost its lease on batch %d to another runner", self.owner, batch)
+                        del self.held[batch]
+                        continue
+                    os.utime(path)
+
+    def close(self):
+        self._stop.set()
+        self._heartbeat.join()
+
+    def progress(self):
+        done = sum(1 for _ in os.scandir(self.done_dir))
+        return done, self.num_batches
@@ -0,0 +1,256 @@
+import argparse
+import logging
+import os
+import re
+import sqlite3
+import time
+
+from sql_cache import file_digest
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    file_id INTEGER PRIMARY KEY,
+    file_name TEXT NOT NULL UNIQUE,
+    content_hash TEXT,  -- freshness_key(): producer, code version and content digest
+    indexed_at REAL
+);
+CREATE TABLE IF NOT EXISTS statements (
+    statement_id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL REFERENCES files(file_id) ON DELETE CASCADE,
+    start_line INTEGER,
+    end_line INTEGER,
+    sql_text TEXT
+);
+CREATE TABLE IF NOT EXISTS column_refs (
+    statement_id INTEGER NOT NULL REFERENCES statements(statement_id) ON DELETE CASCADE,
+    schema_name TEXT COLLATE NOCASE,
+    table_name TEXT COLLATE NOCASE,
+    column_name TEXT COLLATE NOCASE,
+    column_expr TEXT
+);
+CREATE INDEX IF NOT EXISTS statements_by_file ON statements(file_id);
+CREATE INDEX IF NOT EXISTS refs_by_column ON column_refs(column_name, table_name, schema_name);
+CREATE INDEX IF NOT EXISTS refs_by_table ON column_refs(table_name, schema_name);
+CREATE INDEX IF NOT EXISTS refs_by_statement ON column_refs(statement_id);
+"""
+
+
+# A column reference of one to three identifier parts, where parser.py writes N/A for a missing schema;
+# expressions don't match
+COLUMN_NAME = re.compile(r'((N/A|[A-Za-z_][\w$#]*)\.)?([A-Za-z_][\w$#]*\.)?[A-Za-z_][\w$#]*$')
+
+
+def tables_from_rows(rows, file_name):
+    # Convert parser.py's records ({'Starting Line', 'Schema', 'Table', 'Columns'}) to the
+    # sql_parser table shape that LineageIndex.update_file takes. A row's Columns lists every column
+    # of the statement, so each column is filed under the table its qualifier names rather than
+    # under every table of the statement; expressions such as COUNT(*) are dropped. The records carry
+    # no end line or SQL text, so those are left NULL.
+    tables = {}
+    statement_columns = {}  # statement key -> (its tables, its Columns value)
+    for row in rows:
+        statement_key = (file_name, row['Starting Line'])
+        table = tables.setdefault(row['Table'], {'schema': row['Schema'], 'columns': {}, 'statements': {}})
+        table['statements'][statement_key] = (None, None)
+        statement_tables, _ = statement_columns.setdefault(statement_key, (set(), row['Columns']))
+        statement_tables.add(row['Table'])
+
+    for statement_key, (statement_tables, columns) in statement_columns.items():
+        for column in columns.split(','):
+            column = column.strip()
+            if not COLUMN_NAME.match(column):
+                continue
+            parts = column.split('.')
+            if len(parts) == 3:
+                schema_name, table_name = parts[0], parts[1]
+            elif len(parts) == 2 and parts[0] in statement_tables:
+                schema_name, table_name = None, parts[0]
+            elif len(parts) == 1 and len(statement_tables) == 1:
+                schema_name, table_name = None, next(iter(statement_tables))
+            else:
+                # An alias or an unqualified name in a join: no table to file it under
+                continue
+            table = tables.setdefault(table_name, {'schema': schema_name, 'columns': {}, 'statements': {}})
+            table['statements'].setdefault(statement_key, (None, None))
+            table['columns'].setdefault(column, set()).add(statement_key)
+    return tables
+
+
+def freshness_key(content_hash, producer, version):
+    # What a file was indexed from: its content and the extractor (name and code version) that read it,
+    # so an upgraded extractor, or the other extractor, reindexes files whose content did not change
+    return f"{producer}:{version}:{content_hash}"
+
+
+def _parse_name(name, parts):
+    # 'hr.employees.salary' -> ['hr', 'employees', 'salary']; shorter names leave the leading parts as None
+    pieces = name.split('.')
+    return [None] * (parts - len(pieces)) + pieces[-parts:]
+
+
+class LineageIndex:
+    # Extracted lineage in SQLite: files -> statements -> column references, indexed both ways
+
+    def __init__(self, index_path):
+        self.connection = sqlite3.connect(index_path)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def is_current(self, file_name, key):
+        # key is the file's freshness_key()
+        row = self.connection.execute("SELECT content_hash FROM files WHERE file_name = ?", (file_name,)).fetchone()
+        return row is not None and row[0] == key
+
+    def update_file(self, file_name, tables, key=None):
+        # Replace everything indexed for one file in a single transaction; other files are untouched.
+        # tables is the per-file result of sql_parser's extract_tables_and_columns, key its freshness_key().
+        with self.connection:
+            self.connection.execute("DELETE FROM files WHERE file_name = ?", (file_name,))
+            file_id = self.connection.execute(
+                "INSERT INTO files (file_name, content_hash, indexed_at) VALUES (?, ?, ?)",
+                (file_name, key, time.time())).lastrowid
+
+            statement_ids = {}
+            for table_info in tables.values():
+                for statement_key, (end_line, statement) in table_info['statements'].items():
+                    if statement_key not in statement_ids:
+                        statement_ids[statement_key] = self.connection.execute(
+                            "INSERT INTO statements (file_id, start_line, end_line, sql_text) VALUES (?, ?, ?, ?)",
+                            (file_id, statement_key[1], end_line, statement)).lastrowid
+
+            refs = []
+            for table_name, table_info in tables.items():
+                for column, statement_keys in table_info['columns'].items():
+                    # Columns are stored as written (e.g. e.salary); the bare name is what lookups match on
+                    column_name = column.rsplit('.', 1)[-1]
+                    for statement_key in statement_keys:
+                        refs.append((statement_ids[statement_key], table_info['schema'], table_name, column_name, column))
+            self.connection.executemany(
+                "INSERT INTO column_refs (statement_id, schema_name, table_name, column_name, column_expr) "
+                "VALUES (?, ?, ?, ?, ?)", refs)
+
+    def remove_file(self, file_name):
+        with self.connection:
+            self.connection.execute("DELETE FROM files WHERE file_name = ?", (file_name,))
+
+    # Forward lookups
+
+    def files(self):
+        return [row[0] for row in self.connection.execute("SELECT file_name FROM files ORDER BY file_name")]
+
+    def tables_in_file(self, file_name):
+        return self.connection.execute(
+            "SELECT DISTINCT r.schema_name, r.table_name FROM column_refs r "
+            "JOIN statements s ON s.statement_id = r.statement_id JOIN files f ON f.file_id = s.file_id "
+            "WHERE f.file_name = ? ORDER BY r.schema_name, r.table_name", (file_name,)).fetchall()
+
+    def columns_in_file(self, file_name, table=None):
+        schema_name, table_name = _parse_name(table, 2) if table else (None, None)
+        return self.connection.execute(
+            "SELECT DISTINCT r.schema_name, r.table_name, r.column_name FROM column_refs r "
+            "JOIN statements s ON s.statement_id = r.statement_id JOIN files f ON f.file_id = s.file_id "
+            "WHERE f.file_name = ? AND (? IS NULL OR r.table_name = ?) AND (? IS NULL OR r.schema_name = ?) "
+            "ORDER BY r.schema_name, r.table_name, r.column_name",
+            (file_name, table_name, table_name, schema_name, schema_name)).fetchall()
+
+    # Reverse lookups
+
+    def statements_for_column(self, column):
+        # column is 'schema.table.column', 'table.column' or 'column'
+        schema_name, table_name, column_name = _parse_name(column, 3)
+        return self.connection.execute(
+            "SELECT DISTINCT f.file_name, s.start_line, s.end_line, s.sql_text FROM column_refs r "
+            "JOIN statements s ON s.statement_id = r.statement_id JOIN files f ON f.file_id = s.file_id "
+            "WHERE r.column_name = ? AND (? IS NULL OR r.table_name = ?) AND (? IS NULL OR r.schema_name = ?) "
+            "ORDER BY f.file_name, s.start_line",
+            (column_name, table_name, table_name, schema_name, schema_name)).fetchall()
+
+    def files_for_table(self, table):
+        # table is 'schema.table' or 'table'
+        schema_name, table_name = _parse_name(table, 2)
+        return [row[0] for row in self.connection.execute(
+            "SELECT DISTINCT f.file_name FROM column_refs r "
+            "JOIN statements s ON s.statement_id = r.statement_id JOIN files f ON f.file_id = s.file_id "
+            "WHERE r.table_name = ? AND (? IS NULL OR r.schema_name = ?) ORDER BY f.file_name",
+            (table_name, schema_name, schema_name))]
+
+    def stats(self):
+        return {name: self.connection.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
+                for name in ('files', 'statements', 'column_refs')}
+
+
+def update_index(index_path, file_paths, results, producer, version):
+    # Index each file's parse result. Files indexed from the same content by the same extractor version
+    # are skipped; files no longer among file_paths are removed, so the index matches the input set.
+    index = LineageIndex(index_path)
+    updated = 0
+    file_names = set()
+    for file_path, tables in zip(file_paths, results):
+        file_name = os.path.basename(file_path)
+        file_names.add(file_name)
+        key = freshness_key(file_digest(file_path), producer, version)
+        if not index.is_current(file_name, key):
+            index.update_file(file_name, tables, key)
+            updated += 1
+    removed = [file_name for file_name in index.files() if file_name not in file_names]
+    for file_name in removed:
+        index.remove_file(file_name)
+    index.close()
+    logger.info("Lineage index %s: %d of %d files updated, %d removed", index_path, updated, len(file_paths),
+                len(removed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the lineage index written by parser.py / sql_parser")
+    parser.add_argument('index', help='Path of the SQLite index, e.g. parser_lineage.db or sql_parser_lineage.db')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('files', help='List indexed files')
+    command = commands.add_parser('tables', help='Tables (and with --columns, their columns) used by a file')
+    command.add_argument('file_name')
+    command.add_argument('--columns', action='store_true')
+    command = commands.add_parser('column', help='Statements touching schema.table.column, table.column or column')
+    command.add_argument('column')
+    command.add_argument('--sql', action='store_true', help='Print the statement text too')
+    command = commands.add_parser('table', help='Files touching schema.table or table')
+    command.add_argument('table')
+    commands.add_parser('stats', help='Row counts of the index')
+    args = parser.parse_args()
+
+    index = LineageIndex(args.index)
+    start = time.perf_counter()
+    if args.command == 'files':
+        results = index.files()
+        for file_name in results:
+            print(file_name)
+    elif args.command == 'tables':
+        results = index.columns_in_file(args.file_name) if args.columns else index.tables_in_file(args.file_name)
+        for row in results:
+            print(".".join(row))
+    elif args.command == 'column':
+        results = index.statements_for_column(args.column)
+        for file_name, start_line, end_line, sql_text in results:
+            # parser.py's index records start lines only
+            print(f"{file_name}:{start_line}-{end_line}" if end_line is not None else f"{file_name}:{start_line}")
+            if args.sql and sql_text is not None:
+                print(sql_text + "\n")
+    elif args.command == 'table':
+        results = index.files_for_table(args.table)
+        for file_name in results:
+            print(file_name)
+    else:
+        results = index.stats()
+        for name, count in results.items():
+            print(f"{name}: {count}")
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    print(f"-- {len(results)} results in {elapsed_ms:.1f} ms")
+    index.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+import logging
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+import pandas as pd
+
+from stage_profile import PROFILE
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Parquet output is optional
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+# Excel's hard row limit per sheet, header row included
+EXCEL_MAX_ROWS = 1048576
+EXCEL_MAX_SHEET_NAME = 31
+
+# Rows handed to a writer at a time, so the serialised output is never built in one piece
+CHUNK_ROWS = 100000
+
+BACKENDS_BY_EXTENSION = {
+    '.xlsx': 'excel',
+    '.csv': 'csv',
+    '.parquet': 'parquet',
+    '.db': 'sqlite',
+    '.sqlite': 'sqlite',
+}
+
+
+def backend_for(output_file):
+    extension = os.path.splitext(output_file)[1].lower()
+    if extension not in BACKENDS_BY_EXTENSION:
+        raise ValueError(f"Unknown output type '{extension}'; use one of {', '.join(BACKENDS_BY_EXTENSION)}")
+    return BACKENDS_BY_EXTENSION[extension]
+
+
+def _table_path(output_file, name, single):
+    # CSV and Parquet hold one table per file: output.csv, or output_Columns.csv when there are several
+    if single:
+        return output_file
+    stem, extension = os.path.splitext(output_file)
+    return f"{stem}_{name}{extension}"
+
+
+def _write_csv(tables, output_file):
+    for name, df in tables.items():
+        df.to_csv(_table_path(output_file, name, len(tables) == 1), index=False, chunksize=CHUNK_ROWS)
+
+
+def _write_parquet(tables, output_file):
+    if pyarrow is None:
+        raise RuntimeError("Parquet output needs pyarrow (pip install pyarrow)")
+    for name, df in tables.items():
+        schema = pyarrow.Schema.from_pandas(df, preserve_index=False)
+        with pyarrow.parquet.ParquetWriter(_table_path(output_file, name, len(tables) == 1), schema) as writer:
+            # One row group per chunk keeps the Arrow copy bounded
+            for start in range(0, max(len(df), 1), CHUNK_ROWS):
+                chunk = df.iloc[start:start + CHUNK_ROWS]
+                writer.write_table(pyarrow.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+def _write_sqlite(tables, output_file):
+    # The connection's own with block only commits; closing() releases the file
+    with closing(sqlite3.connect(output_file)) as connection, connection:
+        for name, df in tables.items():
+            df.to_sql(name, connection, if_exists='replace', index=False, chunksize=CHUNK_ROWS)
+
+
+def _excel_sheet_names(name, sheets):
+    # Sheet, Sheet_2, Sheet_3, ... within Excel's 31 character limit
+    names = [name[:EXCEL_MAX_SHEET_NAME]]
+    for number in range(2, sheets + 1):
+        suffix = f"_{number}"
+        names.append(name[:EXCEL_MAX_SHEET_NAME - len(suffix)] + suffix)
+    return names
+
+
+def _write_excel(tables, output_file):
+    rows_per_sheet = EXCEL_MAX_ROWS - 1
+    with pd.ExcelWriter(output_file) as writer:
+        for name, df in tables.items():
+            # Tables over the row limit continue on extra sheets
+            sheets = max(1, -(-len(df) // rows_per_sheet))
+            for number, sheet_name in enumerate(_excel_sheet_names(name, sheets)):
+                start = number * rows_per_sheet
+                df.iloc[start:start + rows_per_sheet].to_excel(writer, sheet_name=sheet_name, index=False)
+            if sheets > 1:
+                logger.info("%s: %d rows split across %d sheets", name, len(df), sheets)
+
+
+WRITERS = {
+    'excel': _write_excel,
+    'csv': _write_csv,
+    'parquet': _write_parquet,
+    'sqlite': _write_sqlite,
+}
+
+
+def write_tables(tables, output_file, backend=None):
+    # tables maps sheet/table names to DataFrames; the backend defaults to the one matching the file extension
+    backend = backend or backend_for(output_file)
+    rows = sum(len(df) for df in tables.values())
+
+    start = time.perf_counter()
+    with PROFILE.timer('write'):
+        WRITERS[backend](tables, output_file)
+    elapsed = time.perf_counter() - start
+    PROFILE.count('rows_written', rows)
+
+    rate = rows / elapsed if elapsed > 0 else float('inf')
+    logger.info("Wrote %d rows to %s with the %s backend in %.2fs (%.0f rows/s)",
+                rows, output_file, backend, elapsed, rate)
+    return elapsed
+
+
+def write_table(df, output_file, backend=None, name='Sheet1'):
+    # Single-table output; 'Sheet1' matches the sheet name DataFrame.to_excel uses by default
+    return write_tables({name: df}, output_file, backend)
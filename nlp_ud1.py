@@ -6,49 +6,42 @@ from keras.layers import Dense
 from keras.layers import Dropout
 from keras.layers import LSTM
 from keras.callbacks import ModelCheckpoint
-from keras.utils import np_utils
+from char_windows import CharDataset
 # load ascii text and covert to lowercase
 filename = "wonderland.txt"
 raw_text = open(filename).read()
 raw_text = raw_text.lower()
-# create mapping of unique chars to integers, and a reverse mapping
-chars = sorted(list(set(raw_text)))
-char_to_int = dict((c, i) for i, c in enumerate(chars))
-int_to_char = dict((i, c) for i, c in enumerate(chars))
+# encode the text once as uint8 character indexes, with the mapping of unique chars to integers
+seq_length = 100
+dataset = CharDataset(raw_text, seq_length)
+chars = dataset.chars
+char_to_int = dataset.char_to_int
+int_to_char = dataset.int_to_char
 # summarize the loaded data
-n_chars = len(raw_text)
-n_vocab = len(chars)
+n_chars = dataset.n_chars
+n_vocab = dataset.n_vocab
 print ("Total Characters: ", n_chars)
 print ("Total Vocab: ", n_vocab)
-# prepare the dataset of input to output pairs encoded as integers
-seq_length = 100
-dataX = []
-dataY = []
-for i in range(0, n_chars - seq_length, 1):
-	seq_in = raw_text[i:i + seq_length]
-	seq_out = raw_text[i + seq_length]
-	dataX.append([char_to_int[char] for char in seq_in])
-	dataY.append(char_to_int[seq_out])
+# input to output pairs: each pattern is a read-only view into the encoded text, not a copy
+dataX = dataset.windows()
+dataY = dataset.targets()
 n_patterns = len(dataX)
 print ("Total Patterns: ", n_patterns)
-# reshape X to be [samples, time steps, features]
-X = numpy.reshape(dataX, (n_patterns, seq_length, 1))
-# normalize
-X = X / float(n_vocab)
-# one hot encode the output variable
-y = np_utils.to_categorical(dataY)
+# output classes as to_categorical(dataY) counted them; for training, model.fit_generator(dataset.batches(),
+# ...) normalizes and one-hot encodes one batch at a time instead of copying every pattern to floats
+n_classes = int(dataY.max()) + 1
 # define the LSTM model
 model = Sequential()
-model.add(LSTM(256, input_shape=(X.shape[1], X.shape[2])))
+model.add(LSTM(256, input_shape=(seq_length, 1)))
 model.add(Dropout(0.2))
-model.add(Dense(y.shape[1], activation='softmax'))
+model.add(Dense(n_classes, activation='softmax'))
 # load the network weights
 filename = "weights-improvement-19-1.9435.hdf5"
 model.load_weights(filename)
 model.compile(loss='categorical_crossentropy', optimizer='adam')
 # pick a random seed
 start = numpy.random.randint(0, len(dataX)-1)
-pattern = dataX[start]
+pattern = [int(value) for value in dataX[start]]
 print "Seed:"
 print "\"", ''.join([int_to_char[value] for value in pattern]), "\""
 # generate characters
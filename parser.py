@@ -1,68 +1,63 @@
+import json
+import logging
 import os
-import re
+import time
 import pandas as pd
 
+import sql_scanner
+import sql_scope
+import sql_splitter
+from file_pool import map_files
+from lineage_index import LineageIndex, freshness_key, tables_from_rows, update_index
+from lineage_output import write_table
+from sql_cache import ResultCache, code_version, file_digest
+from sql_scanner import scan_statement
+from sql_scope import resolve_lineage
+from sql_splitter import split_statements
+from stage_profile import PROFILE
+from static_rules import RuleMatcher
 
-def extract_schema_table_column(sql, start_line):
-    # Regular expression to find the table from the 'FROM' or 'JOIN' clause (schema.table or just table)
-    table_regex = re.compile(
-        r"(FROM|JOIN)\s+([a-zA-Z_][a-zA-Z0-9_]*)(?:\.\s*([a-zA-Z_][a-zA-Z0-9_]*))?(?:\s+AS\s+([a-zA-Z_][a-zA-Z0-9_]*))?",
-        re.IGNORECASE)
+logger = logging.getLogger('parser')
 
-    # Regular expression to find columns from the 'SELECT' clause
-    columns_regex = re.compile(r"SELECT\s+(.*?)\s+(?:FROM|WHERE|GROUP BY|ORDER BY|LIMIT|HAVING)", re.IGNORECASE)
 
+def extract_schema_table_column(sql, start_line):
     schema_table_columns = []
-    alias_to_table_map = {}
 
-    print(f"Parsing SQL starting at line {start_line}")
-
-    # Extract the schema and table (schema.optional.table)
-    table_matches = table_regex.findall(sql)
-    tables = []
-    for match in table_matches:
-        join_type = match[0]
-        schema_name = match[2] if match[2] else "N/A"
-        table_name = match[1]
-        alias = match[3] if match[3] else "N/A"
+    logger.debug("Parsing SQL starting at line %d", start_line)
 
-        # If schema is not provided and the table is in the format schema.table, split it
-        if schema_name == "N/A" and '.' in table_name:
-            schema_name, table_name = table_name.split('.', 1)
+    # Walk the statement once to collect tables, aliases and projected columns
+    scan = scan_statement(sql)
 
-        # Map alias to schema and table
-        if alias != "N/A":
-            alias_to_table_map[alias] = {"schema": schema_name, "table": table_name}
+    tables = []
+    for ref in scan['tables']:
+        join_type = ref['keyword']
+        schema_name = ref['schema']
+        table_name = ref['table']
+        alias = ref['alias'] if ref['alias'] else "N/A"
 
         tables.append({
             "Join Type": join_type,
-            "Schema": schema_name if schema_name != "N/A" else "N/A",
-            "Table": table_name if table_name != "N/A" else "N/A",
-            "Alias": alias if alias != "N/A" else "N/A"
+            "Schema": schema_name,
+            "Table": table_name,
+            "Alias": alias
         })
 
         # Debugging the capture of table names
-        print(f"Join Type: {join_type}, Schema: {schema_name}, Table: {table_name}, Alias: {alias}")
-
-    # Extract columns, excluding any WHERE, GROUP BY, ORDER BY clauses
-    column_match = columns_regex.search(sql)
-    if column_match:
-        # Extract columns (ignore the SQL clause details like WHERE, ORDER BY)
-        columns_part = column_match.group(1).strip()
-
-        # Split the columns by commas and clean extra spaces
-        columns = [col.strip() for col in columns_part.split(',')]
-
-        # For columns that reference aliases (e.g., e.first_name, d.department_name), map them to the correct table
-        for idx, col in enumerate(columns):
-            if '.' in col:
-                alias, column = col.split('.', 1)
-                if alias in alias_to_table_map:
-                    schema, table = alias_to_table_map[alias]["schema"], alias_to_table_map[alias]["table"]
-                    columns[idx] = f"{schema}.{table}.{column}"
+        logger.debug("Join Type: %s, Schema: %s, Table: %s, Alias: %s", join_type, schema_name, table_name, alias)
+
+    if scan['columns']:
+        # Resolve each projected column through CTEs and subqueries to schema.table.column; columns
+        # with no base table (literals, ambiguous unqualified names) are kept as written
+        columns = []
+        for col in resolve_lineage(scan)['columns']:
+            if col['sources']:
+                columns.extend(f"{source['schema']}.{source['table']}.{source['column']}" for source in col['sources'])
+            else:
+                columns.append(col['expr'])
 
         # Debugging the columns for each table
-        print(f"Columns for Tables: {', '.join(columns)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Columns for Tables: %s", ', '.join(columns))
     else:
         columns = ["N/A"]
 
@@ -78,126 +73,273 @@ def extract_schema_table_column(sql, start_line):
     return schema_table_columns
 
 
-def add_static_columns(df, static_data_df):
-    # Create an empty list to hold the updated rows
-    updated_rows = []
-
-    # Iterate through the rows of the DataFrame
-    for index, row in df.iterrows():
-        # Get the list of columns (split by commas)
-        columns = row['Columns'].split(',')
-
-        # Initialize the static values as "N/A" by default
-        sensitivity_level = "N/A"
-        critical_data_element = "N/A"
-        pii = "N/A"
-        financial_data = "N/A"
-        health_data = "N/A"
-        third_party_data = "N/A"
-        regulatory_compliance = "N/A"
-
-        # Check each column against the static data and update the static values
-        for column in columns:
-            column = column.strip()  # Remove any leading or trailing spaces
-            print(f"Checking column: {column} in table: {row['Table']} and schema: {row['Schema']}")
-
-            match = static_data_df[
-                (static_data_df['Column Name'].str.lower() == column.lower()) &
-                (static_data_df['Schema Name'].str.lower() == row['Schema'].lower()) &
-                (static_data_df['Table Name'].str.lower() == row['Table'].lower())
-                ]
-
-            if not match.empty:
-                # Extract the first match found (assuming one-to-one mapping for simplicity)
-                sensitivity_level = match['Sensitivity Level'].values[0]
-                critical_data_element = match['Critical Data Element'].values[0]
-                pii = match['Personal Identifiable Information'].values[0]
-                financial_data = match['Financial Data'].values[0]
-                health_data = match['Health Data'].values[0]
-                third_party_data = match['3rd Party Data'].values[0]
-                regulatory_compliance = match['Regulatory and Compliance Data'].values[0]
-                print(f"Match found for column: {column}")
-                break  # Since it's a match, we can stop looking further
-            else:
-                print(f"No match found for column: {column}")
+# Classification values copied from the static reference data, in output order
+STATIC_COLUMNS = ['Sensitivity Level', 'Critical Data Element', 'Personal Identifiable Information', 'Financial Data',
+                  'Health Data', '3rd Party Data', 'Regulatory and Compliance Data']
+
+
+def build_static_rules(static_data_df):
+    # Literal reference rows go into a hash index, wildcard and re: rows into one combined matcher
+    rows = zip(static_data_df['Schema Name'], static_data_df['Table Name'], static_data_df['Column Name'],
+               static_data_df[STATIC_COLUMNS].itertuples(index=False, name=None))
+    return RuleMatcher(rows)
 
-        # Add the updated row with the new static column values
-        updated_row = row.copy()
-        updated_row['Sensitivity Level'] = sensitivity_level
-        updated_row['Critical Data Element'] = critical_data_element
-        updated_row['Personal Identifiable Information'] = pii
-        updated_row['Financial Data'] = financial_data
-        updated_row['Health Data'] = health_data
-        updated_row['3rd Party Data'] = third_party_data
-        updated_row['Regulatory and Compliance Data'] = regulatory_compliance
 
-        updated_rows.append(updated_row)
+def add_static_columns(df, static_data_df, rules=None):
+    # rules: a matcher from build_static_rules to reuse across calls; built from static_data_df otherwise
+    if df.empty:
+        return pd.DataFrame()
 
-    # Create a new DataFrame with the updated rows
-    updated_df = pd.DataFrame(updated_rows)
+    rules = rules or build_static_rules(static_data_df)
+    pattern_hits = rules.pattern_hits
+    not_found = ("N/A",) * len(STATIC_COLUMNS)
+
+    # For each row take the values of the first listed column found in the reference data; literal
+    # rows take precedence over wildcard and regex rules
+    matches = []
+    for columns, schema, table in zip(df['Columns'], df['Schema'], df['Table']):
+        row_values = rules.classify(schema, table, [column.strip() for column in columns.split(',')])
+        matches.append(not_found if row_values is None else row_values)
+
+    # Add the static column values to a copy of the lineage rows
+    updated_df = df.copy()
+    static_df = pd.DataFrame(matches, columns=STATIC_COLUMNS, index=df.index)
+    for column in STATIC_COLUMNS:
+        updated_df[column] = static_df[column]
+
+    matched = sum(row_values is not not_found for row_values in matches)
+    pattern_hits = rules.pattern_hits - pattern_hits
+    PROFILE.count('static_matches', matched)
+    PROFILE.count('static_pattern_matches', pattern_hits)
+    logger.info("Static data matched for %d of %d rows (%d by pattern rules)", matched, len(df), pattern_hits)
 
     return updated_df
 
 
-def process_sql_files(input_folder, output_excel, static_data_df):
+def parser_version():
+    # Fingerprint of the code behind the lineage rows; keys the result cache and the lineage index
+    return code_version(__file__, sql_scanner.__file__, sql_splitter.__file__, sql_scope.__file__)
+
+
+def parse_sql_file(file_path):
+    schema_table_columns = []
+
+    # Statements are streamed from the file; ';' inside literals or comments does not split them
+    for start_line, end_line, sql in split_statements(file_path):
+        try:
+            with PROFILE.timer('extract'):
+                schema_table_columns.extend(extract_schema_table_column(sql, start_line))
+        except Exception as e:
+            PROFILE.count('statement_errors')
+            logger.error("Error processing SQL statement: %s\n%s", sql, e)
+
+    return schema_table_columns
+
+
+def process_sql_files(input_folder, output_file, static_data_df, workers=1, cache_dir=None, backend=None,
+                      index_path=None):
     all_schema_table_columns = []
 
-    for file_name in os.listdir(input_folder):
-        if file_name.endswith(".sql"):
-            file_path = os.path.join(input_folder, file_name)
-            with open(file_path, "r", encoding="utf-8") as f:
-                sql_content = f.readlines()
-
-            sql_statements = []
-            current_statement = []
-            for idx, line in enumerate(sql_content, start=1):
-                line = line.strip()
-                if line.startswith("--") or not line:
-                    continue
-
-                if ";" in line:
-                    current_statement.append(line)
-                    sql_statements.append((idx, " ".join(current_statement)))
-                    current_statement = []
-                else:
-                    current_statement.append(line)
-
-            for start_line, sql in sql_statements:
-                try:
-                    schema_table_columns = extract_schema_table_column(sql, start_line)
-                    all_schema_table_columns.extend(schema_table_columns)
-                except Exception as e:
-                    print(f"Error processing SQL statement: {sql}\n{e}")
+    file_paths = [os.path.join(input_folder, file_name)
+                  for file_name in os.listdir(input_folder) if file_name.endswith(".sql")]
+
+    # Results of unchanged files are served from the cache; any edit to the parser code invalidates it
+    cache = None
+    if cache_dir:
+        cache = ResultCache(cache_dir, 'parser.py', parser_version())
+
+    # Files are parsed in parallel when workers > 1; results come back in listing order either way
+    results = map_files(parse_sql_file, file_paths, workers, cache)
+    for schema_table_columns in results:
+        all_schema_table_columns.extend(schema_table_columns)
+
+    # Keep the queryable lineage index (see lineage_index.py) in step, file by file
+    if index_path:
+        update_index(index_path, file_paths,
+                     [tables_from_rows(rows, os.path.basename(path)) for path, rows in zip(file_paths, results)],
+                     'parser.py', parser_version())
+
+    if cache:
+        logger.info(cache.summary())
 
     # Output to DataFrame before adding static columns
     df = pd.DataFrame(all_schema_table_columns)
 
     # Add static columns based on reference data
-    updated_df = add_static_columns(df, static_data_df)
-
-    # Write final output to Excel
-    updated_df.to_excel(output_excel, index=False)
-    print(f"Output written to {output_excel}")
+    with PROFILE.timer('classify'):
+        updated_df = add_static_columns(df, static_data_df)
+
+    # Write final output; the backend follows the file extension unless one is given
+    write_table(updated_df, output_file, backend)
+    logger.info("Output written to %s", output_file)
+
+
+def snapshot_folder(input_folder):
+    # (mtime, size) of every .sql file; only files whose stamp moved are read again
+    snapshot = {}
+    for entry in os.scandir(input_folder):
+        if entry.name.endswith(".sql") and entry.is_file():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue  # Deleted since the listing
+            snapshot[entry.path] = (stat.st_mtime_ns, stat.st_size)
+    return snapshot
+
+
+def watch_sql_files(input_folder, output_file, static_data_df, poll_interval=1.0, workers=1, cache_dir=None,
+                    backend=None, index_path=None, max_polls=None, write_delay=10.0):
+    # Long-running mode: parse the folder once, then poll it and re-extract only added or edited files.
+    # Parsed and classified rows, the classification rules and the index connection stay warm between
+    # polls; max_polls ends the loop after that many polls, otherwise it runs until interrupted.
+    # An edit after a quiet poll is written in the same poll. Edits that keep arriving over several polls
+    # (a checkout, a bulk copy) are written after the burst ends, or every write_delay seconds while it lasts.
+    # A file that vanishes or cannot be parsed is treated as removed and picked up again when it next changes.
+    cache = None
+    if cache_dir:
+        cache = ResultCache(cache_dir, 'parser.py', parser_version())
+    rules = build_static_rules(static_data_df)
+    index = LineageIndex(index_path) if index_path else None
+    version = parser_version()
+
+    stamps = {}  # path -> (mtime, size) at the last poll
+    digests = {}  # path -> content digest; a file saved without edits is not parsed again
+    classified = {}  # path -> that file's classified lineage rows
+    pending_since = None  # when the first change not yet in the output was found
+    pending_changed = pending_removed = 0
+    previous_quiet = True  # the last poll found nothing to re-parse or remove
+
+    def parse_files(paths):
+        # (path, rows) for every path that parsed; after a failed batch each file is tried on its own,
+        # so one bad file does not stop the watcher
+        try:
+            return list(zip(paths, map_files(parse_sql_file, paths, workers, cache)))
+        except Exception:
+            if len(paths) == 1:
+                logger.warning("Skipping %s this poll", paths[0], exc_info=True)
+                return []
+        parsed = []
+        for path in paths:
+            parsed.extend(parse_files([path]))
+        return parsed
+
+    def write_output():
+        started = time.perf_counter()
+        frames = [classified[path] for path in sorted(classified)]
+        write_table(pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(), output_file, backend)
+        logger.info("%d files re-parsed, %d removed; %s updated in %.3fs",
+                    pending_changed, pending_removed, output_file, time.perf_counter() - started)
+
+    polls = 0
+    try:
+        while max_polls is None or polls < max_polls:
+            started = time.perf_counter()
+            current = snapshot_folder(input_folder)
+            changed = {}  # path -> new digest
+            for path, stamp in list(current.items()):
+                if stamps.get(path) != stamp:
+                    try:
+                        digest = file_digest(path)
+                    except OSError as e:
+                        # Deleted or being replaced since the listing
+                        logger.warning("Skipping %s this poll: %s", path, e)
+                        del current[path]
+                        continue
+                    if digests.get(path) != digest:
+                        changed[path] = digest
+
+            if index and polls == 0:
+                # Files indexed by an earlier run but deleted since
+                current_names = {os.path.basename(path) for path in current}
+                for file_name in index.files():
+                    if file_name not in current_names:
+                        index.remove_file(file_name)
+
+            # Nothing to parse, and so no cache listing, on a quiet poll; the first poll parses the whole
+            # folder, in parallel when workers > 1
+            parsed = parse_files(list(changed)) if changed else []
+            failed = set(changed) - {path for path, _ in parsed}
+            if parsed:
+                for path, rows in parsed:
+                    digests[path] = changed[path]
+                    with PROFILE.timer('classify'):
+                        classified[path] = add_static_columns(pd.DataFrame(rows), static_data_df, rules)
+                    key = freshness_key(digests[path], 'parser.py', version)
+                    if index and not index.is_current(os.path.basename(path), key):
+                        index.update_file(os.path.basename(path), tables_from_rows(rows, os.path.basename(path)), key)
+                PROFILE.count('watch_reparsed_files', len(parsed))
+            # Files gone since the last poll, and edited files that no longer parse; those keep their stamp,
+            # so they are tried again once they change
+            removed = [path for path in digests if path not in current or path in failed]
+            for path in removed:
+                classified.pop(path, None)
+                del digests[path]
+                if index:
+                    index.remove_file(os.path.basename(path))
+            stamps = current
+
+            quiet = not (parsed or removed)
+            if not quiet:
+                pending_since = pending_since or started
+                pending_changed += len(parsed)
+                pending_removed += len(removed)
+            # Written at once unless the previous poll also had changes, i.e. a burst is still arriving
+            if pending_since is not None and (quiet or previous_quiet or started - pending_since >= write_delay):
+                write_output()
+                pending_since = None
+                pending_changed = pending_removed = 0
+            previous_quiet = quiet
+
+            polls += 1
+            if max_polls is None or polls < max_polls:
+                time.sleep(max(0.0, poll_interval - (time.perf_counter() - started)))
+    except KeyboardInterrupt:
+        logger.info("Watch stopped")
+    finally:
+        if pending_since is not None:
+            write_output()
+        if index:
+            index.close()
 
 
 if __name__ == "__main__":
     input_folder = "input"  # Folder containing the SQL files
-    output_excel = "output.xlsx"  # Name of the Excel file to store the output
-
-    # Sample static data for matching with SQL columns
+    output_file = "output.xlsx"  # Output file; .xlsx, .csv, .parquet or .db selects the backend
+    workers = 1  # Number of parsing processes; use os.cpu_count() for large folders
+    cache_dir = ".sql_cache"  # Parsed results of unchanged files are reused from here; None disables it
+    index_path = "parser_lineage.db"  # Queried with `python lineage_index.py parser_lineage.db ...`; None disables it
+    log_level = logging.WARNING  # logging.INFO for progress, logging.DEBUG for every statement and table match
+    profile_path = "profile.json"  # Stage timings and counters are written here; None disables it
+    watch = False  # Keep running and re-parse only the files that change; stop with Ctrl+C
+    poll_interval = 1.0  # Seconds between folder checks in watch mode
+    logging.basicConfig(level=log_level, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    # Sample static data for matching with SQL columns, by bare column name within a schema and table;
+    # names may also be wildcards (* and ?) or regular expressions written re:<pattern>, which classify
+    # every matching column at once
     static_data = {
-        'Table Name': ['employees', 'departments', 'employees', 'employees'],
-        'Schema Name': ['N/A', 'N/A', 'N/A', 'N/A'],
-        'Column Name': ['e.employee_id', 'd.department_id', 'e.salary', 'e.first_name'],
-        'Sensitivity Level': ['High', 'Low', 'High', 'Low'],
-        'Critical Data Element': ['Y', 'N', 'Y', 'N'],
-        'Personal Identifiable Information': ['Y', 'N', 'Y', 'N'],
-        'Financial Data': ['Y', 'N', 'Y', 'N'],
-        'Health Data': ['N', 'N', 'N', 'N'],
-        '3rd Party Data': ['Y', 'N', 'N', 'N'],
-        'Regulatory and Compliance Data': ['Y', 'N', 'Y', 'Y']
+        'Table Name': ['employees', 'departments', 'employees', 'employees', '*', '*', '*'],
+        'Schema Name': ['N/A', 'N/A', 'N/A', 'N/A', '*', '*', '*'],
+        'Column Name': ['employee_id', 'department_name', 'salary', 'first_name', '*ssn*',
+                        're:.*(_dob|date_of_birth)', 'email*'],
+        'Sensitivity Level': ['High', 'Low', 'High', 'Low', 'High', 'High', 'Medium'],
+        'Critical Data Element': ['Y', 'N', 'Y', 'N', 'Y', 'N', 'N'],
+        'Personal Identifiable Information': ['Y', 'N', 'Y', 'N', 'Y', 'Y', 'Y'],
+        'Financial Data': ['Y', 'N', 'Y', 'N', 'N', 'N', 'N'],
+        'Health Data': ['N', 'N', 'N', 'N', 'N', 'N', 'N'],
+        '3rd Party Data': ['Y', 'N', 'N', 'N', 'N', 'N', 'N'],
+        'Regulatory and Compliance Data': ['Y', 'N', 'Y', 'Y', 'Y', 'Y', 'Y']
     }
 
     static_data_df = pd.DataFrame(static_data)
 
-    process_sql_files(input_folder, output_excel, static_data_df)
+    if watch:
+        watch_sql_files(input_folder, output_file, static_data_df, poll_interval, workers, cache_dir,
+                        index_path=index_path)
+    else:
+        process_sql_files(input_folder, output_file, static_data_df, workers, cache_dir, index_path=index_path)
+
+    # Per-stage timings and counters of this run
+    if profile_path:
+        PROFILE.dump(profile_path)
+    logger.info("Profile: %s", json.dumps(PROFILE.report()))
@@ -0,0 +1,318 @@
+import logging
+import os
+import multiprocessing
+import subprocess
+import socket
+import threading
+import time
+from contextlib import contextmanager
+import psutil
+
+from command_journal import CommandJournal
+from command_metrics import CommandMetrics, MeasuredPopen, format_summary, summarize
+from lease_queue import LeaseQueue
+
+# Runnable version of the Kubernetes command runner in parser_sql. Without QUEUE_DIR each replica takes a
+# fixed slice of the commands by its pod index; with QUEUE_DIR set to a directory every replica can write,
+# replicas claim small batches from a shared queue instead, so no pod idles while another has a backlog.
+# Locally, start several runners against one temp directory:
+#
+#     COMMANDS_FILE=commands.txt QUEUE_DIR=/tmp/queue python pod_runner.py &
+#     COMMANDS_FILE=commands.txt QUEUE_DIR=/tmp/queue python pod_runner.py &
+#
+# With JOURNAL_DIR set, finished commands are journaled and skipped when a pod is restarted; identical
+# command lines count as one command. With METRICS_DIR set, each command's wall and CPU time, peak RSS,
+# exit code and output size go to <hostname>-<pid>.metrics.jsonl there; merge the runners' files with
+# `python command_metrics.py METRICS_DIR/*.metrics.jsonl`.
+COMMANDS_FILE = os.getenv("COMMANDS_FILE", "/app/commands.txt")
+QUEUE_DIR = os.getenv("QUEUE_DIR")  # Shared volume for the queue; use a fresh directory per run
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", 5))  # Commands claimed at a time in queue mode
+LEASE_SECONDS = float(os.getenv("LEASE_SECONDS", 60))  # Unrenewed leases older than this are reclaimed
+ADAPTIVE_WORKERS = os.getenv("ADAPTIVE_WORKERS", "0") == "1"  # Resize the worker count from CPU and memory samples
+MIN_WORKERS = int(os.getenv("MIN_WORKERS", 1))
+MAX_WORKERS = int(os.getenv("MAX_WORKERS", 96))
+SAMPLE_SECONDS = float(os.getenv("SAMPLE_SECONDS", 5))  # Time between controller decisions
+MIN_FREE_MEMORY_GB = float(os.getenv("MIN_FREE_MEMORY_GB", 1))  # Below this the worker count is halved
+HIGH_CPU_PERCENT = float(os.getenv("HIGH_CPU_PERCENT", 90))  # Above this one worker is removed
+LOW_CPU_PERCENT = float(os.getenv("LOW_CPU_PERCENT", 60))  # Below this, with all workers busy, workers are added
+JOURNAL_DIR = os.getenv("JOURNAL_DIR")  # Persistent directory for completion journals; a restarted pod skips finished commands
+METRICS_DIR = os.getenv("METRICS_DIR")  # Directory for per-command metrics files, one per pod
+SLOWEST_COMMANDS = int(os.getenv("SLOWEST_COMMANDS", 10))  # Commands listed in the end-of-run summary
+
+# Names this runner's journal and metrics files and its leases; the pid keeps runners sharing a hostname apart
+RUNNER_ID = f"{socket.gethostname()}-{os.getpid()}"
+journal = None  # This pod's CommandJournal when JOURNAL_DIR is set
+metrics = None  # This pod's CommandMetrics when METRICS_DIR is set
+
+def run_command(command):
+    """Runs a shell command with error handling and returns its exit code and measurement"""
+    started = time.perf_counter()
+    try:
+        process = MeasuredPopen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        stdout, stderr = process.communicate()
+        measurement = (time.perf_counter() - started, len(stdout), process.usage())
+
+        if process.returncode == 0:
+            print(f"Success: {command}")
+        else:
+            print(f"Failed: {command}\nError: {stderr.decode()}")
+        return process.returncode, measurement
+    except Exception as e:
+        print(f"Error running command: {command}\n{str(e)}")
+        return None, (time.perf_counter() - started, None, {'cpu_seconds': None, 'peak_rss_mb': None})
+
+def run_and_report(command):
+    """Runs a command in a pool process and returns it with its exit code and measurement"""
+    return (command,) + run_command(command)
+
+def record_metrics(command, returncode, measurement):
+    """Adds a finished command to this pod's metrics file"""
+    if metrics:
+        wall_seconds, output_bytes, usage = measurement
+        metrics.record(command, wall_seconds, returncode, output_bytes, usage)
+
+def run_journaled(command):
+    """Runs a command unless the journal has it as completed, and journals the result"""
+    if journal and journal.completed(command):
+        print(f"Skipping (completed earlier): {command}")
+        return
+    returncode, measurement = run_command(command)
+    record_metrics(command, returncode, measurement)
+    if journal:
+        journal.record(command, returncode)
+
+def journal_path(runner_id):
+    """Returns the journal file of a runner"""
+    return os.path.join(JOURNAL_DIR, f"{runner_id}.journal")
+
+def open_journal():
+    """Opens this pod's journal and reads the other pods' journals in the same directory"""
+    os.makedirs(JOURNAL_DIR, exist_ok=True)
+    own_path = journal_path(RUNNER_ID)
+    # One key for the directory, so every runner hashes a command the same way
+    pod_journal = CommandJournal(own_path, os.path.join(JOURNAL_DIR, "journal.key"))
+    for entry in os.scandir(JOURNAL_DIR):
+        if entry.name.endswith(".journal") and entry.path != own_path:
+            pod_journal.load_other(entry.path)
+    print(f"Journal {own_path}: {pod_journal.summary()}")
+    return pod_journal
+
+def get_available_cpus():
+    """Returns available CPU count"""
+    return os.cpu_count()
+
+def get_available_memory():
+    """Returns available memory in GB"""
+    return psutil.virtual_memory().available / (1024 ** 3)  # Convert bytes to GB
+
+def get_num_workers():
+    """Returns the parallel worker count for this pod's resources"""
+    available_memory = get_available_memory()
+    available_cpus = get_available_cpus()
+
+    # Set parallel workers: 2-3x CPU count, but adjust for memory
+    num_workers = min(available_cpus * 3, 96)  # Limit workers to 96 as a max
+    # Reduce workers if memory is a constraint
+    if available_memory < 4:
+        num_workers = available_cpus  # One process per CPU
+    if available_memory < 2:
+        num_workers = max(1, available_cpus // 2)  # Further reduce workers for low memory
+    return num_workers
+
+class WorkerController:
+    """Caps the commands in flight; when adaptive, resizes the cap from sampled CPU load and free memory"""
+
+    def __init__(self, start, min_workers=1, max_workers=96, adaptive=False):
+        self.min_workers = min_workers
+        self.max_workers = max(min_workers, max_workers)
+        self.limit = min(max(start, min_workers), self.max_workers)
+        self.in_flight = 0
+        self.condition = threading.Condition()
+        self._stop = threading.Event()
+        self._sampler = None
+        if adaptive:
+            psutil.cpu_percent(interval=None)  # The first reading only starts the measurement
+            self._sampler = threading.Thread(target=self._sample, daemon=True)
+            self._sampler.start()
+
+    @contextmanager
+    def slot(self):
+        with self.condition:
+            while self.in_flight >= self.limit:
+                self.condition.wait()
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.in_flight -= 1
+                self.condition.notify()
+
+    def decide(self, cpu_percent, available_gb, saturated):
+        """Returns the next worker limit and the reason for it"""
+        limit = self.limit
+        # Memory pressure halves the count: an OOM-killed node costs more than a slow one
+        if available_gb < MIN_FREE_MEMORY_GB:
+            return max(self.min_workers, limit // 2), f"{available_gb:.1f} GB available < {MIN_FREE_MEMORY_GB} GB"
+        if cpu_percent > HIGH_CPU_PERCENT:
+            return max(self.min_workers, limit - 1), f"CPU {cpu_percent:.0f}% > {HIGH_CPU_PERCENT:.0f}%"
+        # Grow only while every slot is busy, so an idle tail of the run does not ratchet the count up
+        if saturated and cpu_percent < LOW_CPU_PERCENT and available_gb > 2 * MIN_FREE_MEMORY_GB:
+            return (min(self.max_workers, limit + max(1, limit // 4)),
+                    f"CPU {cpu_percent:.0f}% < {LOW_CPU_PERCENT:.0f}% with all {limit} workers busy")
+        return limit, None
+
+    def _sample(self):
+        while not self._stop.wait(SAMPLE_SECONDS):
+            cpu_percent = psutil.cpu_percent(interval=None)
+            available_gb = get_available_memory()
+            with self.condition:
+                limit, reason = self.decide(cpu_percent, available_gb, self.in_flight >= self.limit)
+                if limit != self.limit:
+                    logging.info(f"Workers {self.limit} -> {limit}: {reason}")
+                    self.limit = limit
+                    self.condition.notify_all()
+
+    def close(self):
+        self._stop.set()
+        if self._sampler:
+            self._sampler.join()
+
+def make_controller():
+    """Returns a controller starting at the resource-based worker count"""
+    num_workers = get_num_workers()
+    if not ADAPTIVE_WORKERS:
+        return WorkerController(num_workers, num_workers, num_workers)
+    controller = WorkerController(num_workers, MIN_WORKERS, MAX_WORKERS, adaptive=True)
+    logging.info(f"Adaptive workers: starting at {controller.limit}, bounds {controller.min_workers}-{controller.max_workers}")
+    return controller
+
+def run_threads(target, count):
+    """Runs target on count threads and waits for all of them"""
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+def run_static(commands, pod_index, total_replicas):
+    """Runs this pod's fixed slice of the commands"""
+    # Ensure at least one command per pod if commands < replicas
+    chunk_size = max(1, len(commands) // total_replicas)
+    start = pod_index * chunk_size
+    end = min(start + chunk_size, len(commands)) if pod_index < total_replicas - 1 else len(commands)
+
+    pod_commands = commands[start:end]  # Assign part of the work to this pod
+
+    print(f"Pod {pod_index} executing {len(pod_commands)} commands")
+
+    if journal:
+        pod_commands = [command for command in pod_commands if not journal.completed(command)]
+        print(f"Pod {pod_index} resuming with {len(pod_commands)} commands not yet completed")
+
+    if not ADAPTIVE_WORKERS:
+        num_workers = get_num_workers()
+        print(f"Running {len(pod_commands)} commands with {num_workers} parallel workers...\n")
+
+        # Run the commands in parallel using multiprocessing; results are recorded as each one finishes
+        with multiprocessing.Pool(num_workers) as pool:
+            for command, returncode, measurement in pool.imap_unordered(run_and_report, pod_commands):
+                record_metrics(command, returncode, measurement)
+                if journal:
+                    journal.record(command, returncode)
+        return
+
+    # Adaptive: threads take the next command whenever the controller has a free slot
+    controller = make_controller()
+    print(f"Running {len(pod_commands)} commands with {controller.limit} parallel workers to start...\n")
+    pending_commands = iter(pod_commands)
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with controller.slot():
+                with lock:
+                    command = next(pending_commands, None)
+                if command is None:
+                    return
+                run_journaled(command)
+
+    run_threads(worker, controller.max_workers)
+    controller.close()
+
+def run_queue(commands, pod_index):
+    """Claims batches from the shared queue until every batch is done"""
+    queue = LeaseQueue(QUEUE_DIR, len(commands), BATCH_SIZE, LEASE_SECONDS, owner=RUNNER_ID)
+    controller = make_controller()
+    print(f"Pod {pod_index} sharing {queue.num_batches} batches of {BATCH_SIZE} with {controller.limit} parallel workers...\n")
+
+    # Each worker thread claims a batch and runs its commands; the commands are processes, so threads suffice.
+    # A batch is only claimed once the controller has a slot for it, so no lease waits on a busy pod.
+    def worker():
+        while True:
+            with controller.slot():
+                batch = queue.claim()
+                if batch is None:
+                    return
+                # The runner that let the lease expire may have finished some of the batch since startup
+                try:
+                    previous_owner = queue.reclaimed_from(batch)
+                    if journal and previous_owner not in (None, RUNNER_ID) \
+                            and os.path.exists(journal_path(previous_owner)):
+                        journal.load_other(journal_path(previous_owner))
+                    for index in queue.batch_range(batch):
+                        if index < len(commands):
+                            run_journaled(commands[index])
+                    queue.complete(batch)
+                except Exception:
+                    # e.g. a full disk under the journal; a held lease would be renewed forever and
+                    # every pod would wait on the batch, so hand it back and stop this worker
+                    logging.exception(f"Batch {batch} failed; releasing its lease")
+                    queue.release(batch)
+                    return
+
+    run_threads(worker, controller.max_workers)
+    controller.close()
+    queue.close()
+
+    done, total = queue.progress()
+    print(f"Pod {pod_index} found {done} of {total} batches done")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    # Get pod index from hostname (Kubernetes sets this)
+    try:
+        pod_index = int(socket.gethostname().split("-")[-1])  # Extract number from pod name
+    except (IndexError, ValueError):
+        pod_index = 0  # Default to 0 if hostname format is unexpected
+
+    # Read commands and distribute workload across replicas
+    with open(COMMANDS_FILE, "r") as f:
+        commands = [line.strip() for line in f.readlines() if line.strip()]
+
+    total_replicas = max(1, int(os.getenv("TOTAL_REPLICAS", 1)))  # Ensure at least 1 replica
+
+    if len(commands) == 0:
+        print("No commands found. Exiting.")
+        exit(0)
+
+    if JOURNAL_DIR:
+        journal = open_journal()
+    if METRICS_DIR:
+        metrics = CommandMetrics(os.path.join(METRICS_DIR, f"{RUNNER_ID}.metrics.jsonl"))
+
+    if QUEUE_DIR:
+        run_queue(commands, pod_index)
+    else:
+        run_static(commands, pod_index, total_replicas)
+
+    if journal:
+        print(f"Journal: {journal.summary()}")
+        journal.close()
+
+    if metrics:
+        print("\n".join(format_summary(summarize(metrics.records, SLOWEST_COMMANDS))))
+        metrics.close()
+
+    print(f"Pod {pod_index} execution complete")
@@ -8,15 +8,11 @@ from keras.preprocessing.sequence import pad_sequences
 from keras.models import model_from_json
 from theano.tensor.shared_randomstreams import RandomStreams
 import pandas as pd
-json_file = open('model.json', 'r')
-loaded_model_json = json_file.read()
-json_file.close()
-loaded_model = model_from_json(loaded_model_json)
+from intent_scoring import encode_sequences, load_model, model_inputs, predict
+# load weights into new model; it only predicts, so it is not compiled
+loaded_model = load_model('model.json', 'model.h5')
 print (loaded_model)
-# load weights into new model
-loaded_model.load_weights("model.h5")
 print("Loaded model from disk")
-loaded_model.compile(loss='categorical_crossentropy', optimizer='adam', metrics=['accuracy'])
 numpy.random.seed(1984)
 alphabet = pd.read_excel('C:/Users/uddalak/Desktop/intent_test.xls')
 num_inputs = alphabet.shape[0]
@@ -28,31 +24,16 @@ int_to_char = dict((i, c) for i, c in enumerate(alphabet1))
 print (int_to_char)
 max_len = 5
 print (max_len)
-dataX = []
-for i in range(num_inputs):
-	dataX.append([char_to_int[char] for char in alphabet.sequence_in[i]])
-	#dataY.append([char_to_int[char] for char in alphabet.sequence_out[i]])
-	#print (alphabet.sequence_in[i], '->', alphabet.sequence_out[i])
-X = pad_sequences(dataX, maxlen=max_len, dtype='float32')
-X = numpy.reshape(X, (X.shape[0], max_len, 1))
-X = X / float(len(alphabet))
+batch_size = 4096
+# One vectorized char->int lookup and pad for all rows
+X = encode_sequences(alphabet.sequence_in, max_len, alphabet1)
+X = model_inputs(X, len(alphabet))
 
-loaded_model.compile(loss='categorical_crossentropy', optimizer='adam', metrics=['accuracy'])
+# The same random draw of rows as the per-row loop, predicted in batches
+pattern_indexes = numpy.random.randint(num_inputs, size=num_inputs)
+indexes, confidences = predict(loaded_model, X[pattern_indexes], batch_size)
 for i in range(num_inputs):
-    pattern_index = numpy.random.randint(len(dataX))
-    print (pattern_index)
-    pattern = dataX[pattern_index]
-    print (pattern)
-    x = pad_sequences([pattern], maxlen=max_len, dtype='float32')
-    print(x)
-    x = numpy.reshape(x, (1, max_len, 1))
-    print(x)
-    x = x / float(len(alphabet))
-    print (x)
-    prediction = loaded_model.predict(x, verbose=0)
-    idx = numpy.argmax(prediction)
-    result = int_to_char[idx]
-    seq_in = [int_to_char[value] for value in pattern]
+    pattern_index = pattern_indexes[i]
+    result = int_to_char[indexes[i]]
+    seq_in = list(alphabet.sequence_in[pattern_index])
     print (seq_in, "->", result)
-
-
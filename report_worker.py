@@ -0,0 +1,93 @@
+import contextlib
+import io
+import os
+import pickle
+import resource
+import runpy
+import select
+import subprocess
+import sys
+import traceback
+
+
+NO_USAGE = {'cpu_seconds': None, 'peak_rss_mb': None}
+
+
+class ReportWorker:
+    """A long-lived Python process that runs report.py jobs given as argument lists, one at a time."""
+
+    def __init__(self, report_script):
+        self.process = subprocess.Popen([sys.executable, os.path.abspath(__file__), report_script],
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def run(self, argv, timeout=None):
+        # Returns (stdout, stderr, returncode, usage) like a finished command; returncode is None on a timeout,
+        # after which the worker is killed and a new one has to be started
+        pickle.dump(argv, self.process.stdin)
+        self.process.stdin.flush()
+        ready, _, _ = select.select([self.process.stdout], [], [], timeout)
+        if not ready:
+            self.close(kill=True)
+            return "", "", None, NO_USAGE
+        try:
+            return pickle.load(self.process.stdout)
+        except EOFError:
+            returncode = self.process.wait()
+            return "", f"report worker exited with {returncode}\n", returncode, NO_USAGE
+
+    def close(self, kill=False):
+        if kill:
+            self.process.kill()
+        else:
+            self.process.stdin.close()
+        self.process.wait()
+
+
+def run_job(report_script, argv):
+    # Runs report.py as __main__ with argv as its arguments; modules it imports stay loaded for the next job
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    returncode = 0
+    before = resource.getrusage(resource.RUSAGE_SELF)
+    sys.argv = [report_script] + argv
+    try:
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            runpy.run_path(report_script, run_name="__main__")
+    except SystemExit as e:
+        if isinstance(e.code, int):
+            returncode = e.code
+        elif e.code is not None:
+            stderr.write(f"{e.code}\n")
+            returncode = 1
+    except Exception:
+        traceback.print_exc(file=stderr)
+        returncode = 1
+    # CPU time is the job's own; peak RSS is the worker's high-water mark so far, the job's at most
+    after = resource.getrusage(resource.RUSAGE_SELF)
+    usage = {'cpu_seconds': round(after.ru_utime + after.ru_stime - before.ru_utime - before.ru_stime, 4),
+             'peak_rss_mb': round(after.ru_maxrss / 1024, 1)}
+    return stdout.getvalue(), stderr.getvalue(), returncode, usage
+
+
+def serve(report_script):
+    # Jobs arrive pickled on stdin and results go back pickled on stdout; anything written straight to
+    # file descriptor 1 (by a child process of report.py, say) is sent to stderr instead
+    jobs = os.fdopen(os.dup(0), "rb")
+    results = os.fdopen(os.dup(1), "wb")
+    os.dup2(os.open(os.devnull, os.O_RDONLY), 0)
+    os.dup2(2, 1)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(report_script)))
+    while True:
+        try:
+            argv = pickle.load(jobs)
+        except EOFError:
+            return
+        pickle.dump(run_job(report_script, argv), results)
+        results.flush()
+
+
+if __name__ == "__main__":
+    serve(sys.argv[1])
@@ -0,0 +1,113 @@
+import hashlib
+import os
+import pickle
+import shutil
+import tempfile
+
+from stage_profile import PROFILE
+
+
+def file_digest(file_path):
+    # SHA-256 of the file's bytes, read in blocks so large dumps are never held in memory
+    digest = hashlib.sha256()
+    with PROFILE.timer('read'), open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_key(file_path):
+    # Content hash plus the file name, since extractors record the file name alongside each statement
+    return hashlib.sha256(f"{os.path.basename(file_path)}:{file_digest(file_path)}".encode()).hexdigest()
+
+
+def code_version(*source_paths):
+    # Fingerprint of the parser source files; editing any of them invalidates every cached result
+    digest = hashlib.sha256()
+    for path in source_paths:
+        digest.update(file_digest(path).encode())
+    return digest.hexdigest()[:16]
+
+
+class ResultCache:
+    # Parsed per-file results on disk, stored as <cache_dir>/<producer>/<version>/<content hash>.pickle;
+    # extractors sharing a cache_dir each keep their own results
+
+    def __init__(self, cache_dir, producer, version):
+        self.cache_dir = cache_dir
+        self.producer = producer
+        self.version = version
+        self.producer_dir = os.path.join(cache_dir, producer)
+        self.entry_dir = os.path.join(self.producer_dir, version)
+        os.makedirs(self.entry_dir, exist_ok=True)
+        self.used = set()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def _entry_path(self, digest):
+        return os.path.join(self.entry_dir, digest + '.pickle')
+
+    def get(self, digest):
+        # Returns (found, result); unreadable entries count as misses and get rewritten
+        self.used.add(digest)
+        try:
+            with open(self._entry_path(digest), 'rb') as f:
+                result = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            PROFILE.count('cache_misses')
+            return False, None
+        self.hits += 1
+        PROFILE.count('cache_hits')
+        return True, result
+
+    def put(self, digest, result):
+        # Write to a temp file first so an interrupted run never leaves a truncated entry behind
+        self.used.add(digest)
+        try:
+            self._write(digest, result)
+        except FileNotFoundError:
+            # Another run's eviction removed the directory or the temp file; the entry is only a cache
+            os.makedirs(self.entry_dir, exist_ok=True)
+            try:
+                self._write(digest, result)
+            except FileNotFoundError:
+                pass
+
+    def _write(self, digest, result):
+        fd, temp_path = tempfile.mkstemp(dir=self.entry_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, self._entry_path(digest))
+
+    def evict_stale(self):
+        # Drop this producer's results from other code versions and for content not seen in this run;
+        # other runs may be evicting at the same time, so entries that are already gone are skipped
+        for name in os.listdir(self.producer_dir):
+            path = os.path.join(self.producer_dir, name)
+            if name != self.version and os.path.isdir(path):
+                try:
+                    self.evicted += len(os.listdir(path))
+                except FileNotFoundError:
+                    continue
+                shutil.rmtree(path, ignore_errors=True)
+        try:
+            names = os.listdir(self.entry_dir)
+        except FileNotFoundError:
+            return self.evicted
+        for name in names:
+            digest, extension = os.path.splitext(name)
+            if extension == '.tmp' or digest not in self.used:
+                try:
+                    os.remove(os.path.join(self.entry_dir, name))
+                except FileNotFoundError:
+                    continue
+                self.evicted += 1
+        return self.evicted
+
+    def summary(self):
+        total = self.hits + self.misses
+        hit_rate = 100.0 * self.hits / total if total else 0.0
+        return (f"Cache: {self.hits} hits, {self.misses} misses ({hit_rate:.1f}% hit rate), "
+                f"{self.evicted} stale entries evicted")
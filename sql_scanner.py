@@ -0,0 +1,439 @@
+import re
+
+# Building blocks shared by the patterns below
+NAME = r'(?:[A-Za-z_][A-Za-z0-9_$#]*|"[^"]*"|`[^`]*`|\[[^\]]*\])'
+DOTTED_NAME = NAME + r'(?:\s*\.\s*' + NAME + r')*'
+TRIVIA = r'(?:\s|--[^\n]*|/\*[^*]*\*+(?:[^/*][^*]*\*+)*/)*'
+
+# Full tokenizer, used where every token matters (cleaning projection text, tooling)
+TOKEN_REGEX = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<comment>--[^\n]*|/\*[^*]*\*+(?:[^/*][^*]*\*+)*/|/\*.*\Z)
+  | (?P<string>'[^']*(?:''[^']*)*'?)
+  | (?P<name>""" + DOTTED_NAME + r"""(?:\s*\.\s*\*)?)
+  | (?P<number>\d+(?:\.\d*)?(?:[eE][+-]?\d+)?|\.\d+)
+  | (?P<op><=|>=|<>|!=|\|\||::|[=<>+\-*/%])
+  | (?P<punct>[(),;])
+  | (?P<other>.)
+""", re.VERBOSE | re.DOTALL)
+
+# The scanner only stops on tokens that change its state: punctuation, the first character of
+# strings, quoted names and comments, and clause keywords. It runs over an ASCII-lowercased copy
+# of the statement so that it can start with a plain character class, which the regex engine
+# skips through without trying every alternative at every position.
+KEYWORDS = (
+    r's(?:elect|et)|f(?:rom|etch|ull)|join|o(?:n|rder|ffset|uter)|w(?:here|indow|ith)|group|having'
+    r'|l(?:imit|eft)|qualify|u(?:nion|sing)|i(?:ntersect|nto|nner)|except|minus|values|r(?:eturning|ight)'
+    r'|cross|natural'
+)
+SCAN_REGEX = re.compile(
+    r"[\s\-/'\"`\[(),;=](?:(?<=\s)(?P<keyword>" + KEYWORDS + r")(?![a-z0-9_$#])|(?<!\s))")
+# Directly inside a projection list commas only separate items; they are split in bulk when the
+# list ends, so the scanner does not stop on them there
+SELECT_LIST_REGEX = re.compile(
+    r"[\s\-/'\"`\[();](?:(?<=\s)(?P<keyword>" + KEYWORDS + r")(?![a-z0-9_$#])|(?<!\s))")
+KEYWORD_REGEX = re.compile(r'(?:' + KEYWORDS + r')(?![a-z0-9_$#])')
+KEYWORD_INITIALS = set('sfjowghlqiuemvrcn')
+
+ASCII_LOWER = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')
+
+# "name [AS] alias" right after FROM, JOIN or a comma in the FROM list
+TABLE_REF_REGEX = re.compile(
+    TRIVIA + r'(?P<name>' + DOTTED_NAME + r')(?P<call>\s*\()?'
+    + r'(?:' + TRIVIA + r'(?P<as>AS(?![A-Za-z0-9_$#]))?' + TRIVIA + r'(?P<alias>' + NAME + r'))?',
+    re.IGNORECASE)
+
+# "[AS] alias" after the closing paren of a derived table
+DERIVED_ALIAS_REGEX = re.compile(
+    TRIVIA + r'(?P<as>AS(?![A-Za-z0-9_$#]))?' + TRIVIA + r'(?P<alias>' + NAME + r')', re.IGNORECASE)
+
+OPEN_PAREN_REGEX = re.compile(TRIVIA + r'\(')
+
+# Column references on either side of '=' inside an ON clause
+DOTTED_NAME_REGEX = re.compile(DOTTED_NAME)
+RIGHT_REF_REGEX = re.compile(TRIVIA + r'(' + DOTTED_NAME + r')(?![A-Za-z0-9_$#])(?!\s*[.(])')
+
+# "name [(columns)] AS [NOT] [MATERIALIZED]" right before the paren that opens a CTE body
+CTE_HEAD_REGEX = re.compile(
+    r'(?P<name>' + NAME + r')\s*(?:\([^()]*\)\s*)?AS\s*(?:(?:NOT\s+)?MATERIALIZED\s*)?$', re.IGNORECASE)
+
+NAME_PART_REGEX = re.compile(r'"([^"]*)"|`([^`]*)`|\[([^\]]*)\]|([^\s.]+)')
+
+# Top-level commas of a projection list that contains parens, literals or comments
+ITEM_SPLIT_REGEX = re.compile(r"""--[^\n]*|/\*[^*]*\*+(?:[^/*][^*]*\*+)*/|'[^']*(?:''[^']*)*'?|"[^"]*"|`[^`]*`|[(),]""")
+
+ALIAS_NAME_REGEX = re.compile(r'[A-Za-z_][A-Za-z0-9_$#]*|"[^"]*"|`[^`]*`|\[[^\]]*\]')
+
+# Words that can never be a table or column alias
+RESERVED = {
+    'ALL', 'AND', 'ANY', 'APPLY', 'AS', 'ASC', 'BETWEEN', 'BY', 'CASE', 'CROSS', 'DELETE', 'DESC', 'DISTINCT',
+    'ELSE', 'END', 'EXCEPT', 'EXISTS', 'FETCH', 'FROM', 'FULL', 'GROUP', 'HAVING', 'IN', 'INNER', 'INSERT',
+    'INTERSECT', 'INTO', 'IS', 'JOIN', 'LATERAL', 'LEFT', 'LIKE', 'LIMIT', 'MINUS', 'NATURAL', 'NOT', 'NULL',
+    'OFFSET', 'ON', 'OR', 'ORDER', 'OUTER', 'PIVOT', 'QUALIFY', 'RETURNING', 'RIGHT', 'SELECT', 'SET', 'THEN',
+    'UNION', 'UNPIVOT', 'UPDATE', 'USING', 'VALUES', 'WHEN', 'WHERE', 'WINDOW', 'WITH',
+}
+
+# Reserved words that are still function calls when followed by '('
+CALLABLE_KEYWORDS = {'LEFT', 'RIGHT'}
+
+JOIN_MODIFIERS = {'LEFT', 'RIGHT', 'FULL', 'INNER', 'OUTER', 'CROSS', 'NATURAL'}
+
+FROM_CLAUSES = ('FROM', 'JOIN', 'ON')
+
+SET_OPERATORS = {'UNION', 'INTERSECT', 'EXCEPT', 'MINUS'}
+
+
+def tokenize(sql, keep_trivia=False):
+    """Yields (kind, text, start, end) for every token of the statement"""
+    for match in TOKEN_REGEX.finditer(sql):
+        kind = match.lastgroup
+        if not keep_trivia and (kind == 'space' or kind == 'comment'):
+            continue
+        yield kind, match.group(), match.start(), match.end()
+
+
+def split_name(name):
+    """Splits a dotted, possibly quoted identifier into its parts"""
+    if '"' not in name and '`' not in name and '[' not in name:
+        if ' ' in name or '\n' in name or '\t' in name:
+            return [part.strip() for part in name.split('.')]
+        return name.split('.')
+    return [next(group for group in match.groups() if group is not None)
+            for match in NAME_PART_REGEX.finditer(name)]
+
+
+def _clean(text):
+    # Collapse whitespace and drop comments from a slice of the statement
+    if '--' in text or '/*' in text:
+        parts = []
+        for kind, token, _, _ in tokenize(text, keep_trivia=True):
+            parts.append(' ' if kind == 'space' or kind == 'comment' else token)
+        text = ''.join(parts)
+    return ' '.join(text.split())
+
+
+def _skip_literal(low, start, length):
+    # End of the comment, string literal or quoted name starting at `start`
+    char = low[start]
+    if char == '-' or char == '/':
+        if low.startswith('--', start):
+            end = low.find('\n', start)
+            return length if end < 0 else end
+        if low.startswith('/*', start):
+            end = low.find('*/', start + 2)
+            return length if end < 0 else end + 2
+        return start + 1
+    if char == "'":
+        end = start
+        while True:
+            end = low.find("'", end + 1)
+            if end < 0:
+                return length
+            if not low.startswith("''", end):
+                return end + 1
+            end += 1
+    closing = ']' if char == '[' else char
+    end = low.find(closing, start + 1)
+    return length if end < 0 else end + 1
+
+
+def _name_before(sql, end):
+    # The (possibly dotted or quoted) name that ends right before `end`, or ''
+    text = sql[max(0, end - 256):end].rstrip()
+    start = len(text)
+    while start > 0 and (text[start - 1].isalnum() or text[start - 1] in '_$#."`[]'):
+        start -= 1
+    return text[start:]
+
+
+def _is_alias(name):
+    return name[0] in '"`[' or name.upper() not in RESERVED
+
+
+def _split_items(text):
+    # Splits a projection list on the commas that are not inside parens, literals or comments;
+    # returns (offset, item) pairs
+    items = []
+    depth = 0
+    start = 0
+    for match in ITEM_SPLIT_REGEX.finditer(text):
+        token = match.group()
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth -= 1
+        elif token == ',' and depth == 0:
+            items.append((start, text[start:match.start()]))
+            start = match.end()
+    items.append((start, text[start:]))
+    return items
+
+
+def _split_alias(expr):
+    # "expr [AS] alias" -> (expr, alias); a bare alias only follows an operand, never an operator or keyword
+    parts = expr.rsplit(' ', 2)
+    last = parts[-1]
+    if not ALIAS_NAME_REGEX.fullmatch(last) or last.upper() in RESERVED:
+        return expr, None
+    if last[0] in '"`[':
+        last = last[1:-1]
+    if len(parts) == 3 and parts[1].upper() == 'AS':
+        return parts[0], last
+    previous = parts[-2]
+    if previous[-1] in ')\'"`]*' or (previous[-1].isalnum() or previous[-1] in '_$#') \
+            and ('.' in previous or previous.upper() == 'END' or previous.upper() not in RESERVED):
+        return expr[:expr.rindex(' ')], last
+    return expr, None
+
+
+class _SelectList:
+    """Projection list of one SELECT, cut out of the statement and split into items when it ends"""
+
+    __slots__ = ('depth', 'columns', 'start', 'nested', 'item_starts')
+
+    def __init__(self, depth, start):
+        self.depth = depth
+        self.columns = []
+        self.start = start
+        self.nested = False  # parens, literals or comments directly inside the list
+        self.item_starts = None  # statement offset of each column, kept for nested lists only
+
+    def close(self, sql, end):
+        text = sql[self.start:end]
+        columns = self.columns
+        if self.nested:
+            items = _split_items(text)
+            self.item_starts = []
+        else:
+            items = text.split(',')
+        for item in items:
+            if self.nested:
+                offset, item = item
+                expr = _clean(item)
+            else:
+                expr = ' '.join(item.split())
+            if not columns:
+                # SELECT DISTINCT / SELECT ALL
+                head = expr[:9].upper()
+                if head.startswith('DISTINCT ') or head.startswith('ALL '):
+                    expr = expr.split(' ', 1)[1]
+            if not expr:
+                continue
+            if ' ' in expr:
+                expr, alias = _split_alias(expr)
+            else:
+                alias = None
+            columns.append({'expr': expr, 'alias': alias})
+            if self.nested:
+                self.item_starts.append(self.start + offset)
+
+
+class Scope:
+    """One query block: its projection, the names its FROM clause makes visible, and its enclosing block"""
+
+    __slots__ = ('parent', 'depth', 'select', 'sources', 'branches', 'join_predicates', 'subqueries')
+
+    def __init__(self, parent, depth, select):
+        self.parent = parent  # enclosing query block, for correlated references
+        self.depth = depth
+        self.select = select
+        self.sources = {}  # lower-cased alias or table name -> table ref dict, or Scope of a derived table
+        self.branches = []  # further SELECTs combined by UNION / INTERSECT / EXCEPT
+        self.join_predicates = []
+        self.subqueries = []  # scalar subqueries inside this block's projection
+
+
+def _table_ref(keyword, name):
+    parts = split_name(name)
+    return {
+        'keyword': keyword,
+        'schema': '.'.join(parts[:-1]) if len(parts) > 1 else 'N/A',
+        'table': parts[-1],
+        'alias': None,
+    }
+
+
+def scan_statement(sql):
+    """Walks a single statement once and returns its tables, aliases, projected columns, join predicates
+    and query-block scopes (see sql_scope for resolving columns through them)"""
+    tables = []
+    aliases = {}
+    join_predicates = []
+    selects = []
+
+    depth = 0
+    clauses = [None]  # current clause keyword per paren depth
+    calls = [False]  # whether the paren at each depth belongs to a function call
+    open_selects = []
+    pending_join = []
+    derived_depths = set()
+
+    # Scope tree: the first query block and the current UNION branch at each paren depth
+    scope_heads = [None]
+    scope_branches = [None]
+    scopes = []  # in the order their parens close, so nested blocks come before the blocks using them
+    ctes = {}
+    cte_depths = {}  # paren depth of an open CTE body -> CTE name
+
+    def read_table(keyword, position):
+        # Reads one table reference and returns where scanning continues
+        match = TABLE_REF_REGEX.match(sql, position)
+        if match is None:
+            if OPEN_PAREN_REGEX.match(sql, position):
+                derived_depths.add(depth + 1)
+            return position
+        if match.group('call'):
+            return match.end('name')  # table-valued function, not a table
+        ref = _table_ref(keyword, match.group('name'))
+        tables.append(ref)
+        scope = scope_branches[depth]
+        alias = match.group('alias')
+        if alias is not None and (match.group('as') or _is_alias(alias)):
+            ref['alias'] = split_name(alias)[0]
+            aliases[ref['alias']] = {'schema': ref['schema'], 'table': ref['table']}
+            if scope is not None:
+                scope.sources[ref['alias'].lower()] = ref
+            return match.end()
+        if scope is not None:
+            scope.sources[ref['table'].lower()] = ref
+        return match.end('name')
+
+    low = sql.translate(ASCII_LOWER)
+    length = len(sql)
+    position = 0
+    queued = KEYWORD_REGEX.match(low)  # keyword found right after punctuation (or at the very start)
+    while True:
+        if queued is not None:
+            start, position = queued.span()
+            word = queued.group()
+            queued = None
+        else:
+            in_list = open_selects and open_selects[-1].depth == depth
+            match = (SELECT_LIST_REGEX if in_list else SCAN_REGEX).search(low, position)
+            if match is None:
+                break
+            word = match.group('keyword')
+            start, position = (match.start('keyword') if word else match.start()), match.end()
+
+        if word is not None:
+            if calls[depth]:
+                continue  # EXTRACT(YEAR FROM x), TRIM(BOTH ' ' FROM x), ...
+            word = word.upper()
+            if word in JOIN_MODIFIERS:
+                if clauses[depth] in FROM_CLAUSES and not OPEN_PAREN_REGEX.match(sql, position):
+                    pending_join.append(word)
+                continue
+
+            # A new clause ends the projection lists opened at this depth
+            while open_selects and open_selects[-1].depth >= depth:
+                open_selects.pop().close(sql, start)
+            previous_clause = clauses[depth]
+            clauses[depth] = word
+            if word == 'JOIN':
+                position = read_table(' '.join(pending_join + ['JOIN']), position)
+            elif word == 'FROM':
+                position = read_table('FROM', position)
+            elif word == 'SELECT':
+                select = _SelectList(depth, position)
+                selects.append(select)
+                open_selects.append(select)
+                head = scope_heads[depth]
+                if head is not None and previous_clause in SET_OPERATORS:
+                    scope_branches[depth] = Scope(head.parent, depth, select)
+                    head.branches.append(scope_branches[depth])
+                else:
+                    if head is not None:
+                        scopes.append(head)
+                    parent = next((scope for scope in reversed(scope_branches[:depth]) if scope is not None), None)
+                    scope_heads[depth] = scope_branches[depth] = Scope(parent, depth, select)
+                    if parent is not None and parent.select in open_selects:
+                        parent.subqueries.append(scope_heads[depth])
+            pending_join = []
+            continue
+
+        char = low[start]
+        if char == ',':
+            if clauses[depth] == 'FROM' and not calls[depth]:
+                position = read_table('FROM', position)
+        elif char == '(':
+            if open_selects and open_selects[-1].depth == depth:
+                open_selects[-1].nested = True
+            caller = _name_before(sql, start).upper()
+            is_call = bool(caller) and (caller not in RESERVED or caller in CALLABLE_KEYWORDS)
+            if clauses[depth] == 'WITH' and not is_call:
+                cte = CTE_HEAD_REGEX.search(sql, max(0, start - 256), start)
+                if cte is not None:
+                    cte_depths[depth + 1] = split_name(cte.group('name'))[0]
+            depth += 1
+            clauses.append(None)
+            calls.append(is_call)
+            scope_heads.append(None)
+            scope_branches.append(None)
+        elif char == ')':
+            if depth > 0:
+                while open_selects and open_selects[-1].depth >= depth:
+                    open_selects.pop().close(sql, start)
+                clauses.pop()
+                calls.pop()
+                head = scope_heads.pop()
+                scope_branches.pop()
+                if head is not None:
+                    scopes.append(head)
+                if depth in cte_depths:
+                    name = cte_depths.pop(depth)
+                    if head is not None:
+                        ctes[name.lower()] = head
+                if depth in derived_depths:
+                    derived_depths.discard(depth)
+                    alias = DERIVED_ALIAS_REGEX.match(sql, position)
+                    if alias is not None and (alias.group('as') or _is_alias(alias.group('alias'))):
+                        position = alias.end()
+                        if head is not None and scope_branches[depth - 1] is not None:
+                            scope_branches[depth - 1].sources[split_name(alias.group('alias'))[0].lower()] = head
+                depth -= 1
+        elif char == '=':
+            # Equality join predicates inside ON clauses
+            if clauses[depth] == 'ON':
+                left = _name_before(sql, start)
+                right = RIGHT_REF_REGEX.match(sql, position)
+                if DOTTED_NAME_REGEX.fullmatch(left) and right is not None and _is_alias(left) \
+                        and _is_alias(right.group(1)):
+                    predicate = ('.'.join(split_name(left)), '.'.join(split_name(right.group(1))))
+                    join_predicates.append(predicate)
+                    if scope_branches[depth] is not None:
+                        scope_branches[depth].join_predicates.append(predicate)
+        elif char == ';':
+            while open_selects:
+                open_selects.pop().close(sql, start)
+        else:
+            # Skip over comments, string literals and quoted names in one step
+            position = _skip_literal(low, start, length)
+            if position > start + 1 and open_selects and open_selects[-1].depth == depth:
+                open_selects[-1].nested = True
+
+        if position < length and low[position] in KEYWORD_INITIALS:
+            queued = KEYWORD_REGEX.match(low, position)
+
+    while open_selects:
+        open_selects.pop().close(sql, len(sql))
+    scopes.extend(head for head in reversed(scope_heads) if head is not None)
+
+    # The projection of the outermost SELECT describes the statement's output columns
+    columns = []
+    if selects:
+        columns = min(selects, key=lambda select: select.depth).columns
+
+    # References to CTEs are not tables
+    if ctes:
+        tables = [ref for ref in tables if ref['schema'] != 'N/A' or ref['table'].lower() not in ctes]
+        aliases = {alias: table for alias, table in aliases.items()
+                   if table['schema'] != 'N/A' or table['table'].lower() not in ctes}
+
+    return {
+        'tables': tables,
+        'aliases': aliases,
+        'columns': columns,
+        'join_predicates': join_predicates,
+        'scopes': scopes,
+        'ctes': ctes,
+    }
@@ -0,0 +1,224 @@
+from sql_scanner import DOTTED_NAME_REGEX, RESERVED, Scope, split_name, tokenize
+
+# Words that show up as bare names inside expressions but never name a column
+EXPRESSION_WORDS = RESERVED | {
+    'INTERVAL', 'TRUE', 'FALSE', 'UNKNOWN', 'CURRENT_DATE', 'CURRENT_TIME', 'CURRENT_TIMESTAMP', 'LOCALTIME',
+    'LOCALTIMESTAMP', 'SYSDATE', 'OVER', 'PARTITION', 'ROWS', 'RANGE', 'UNBOUNDED', 'PRECEDING', 'FOLLOWING',
+    'CURRENT', 'ROW', 'FILTER', 'WITHIN', 'NULLS', 'FIRST', 'LAST', 'ESCAPE', 'SIMILAR', 'ILIKE', 'RLIKE',
+    'REGEXP', 'YEAR', 'MONTH', 'DAY', 'HOUR', 'MINUTE', 'SECOND',
+}
+
+
+def expression_refs(expr):
+    # Column references in one projection expression: every name that is not a function, keyword,
+    # type (CAST(x AS INT), x::INT) or typed literal prefix (DATE '2020-01-01')
+    if DOTTED_NAME_REGEX.fullmatch(expr):
+        return [] if expr.upper() in EXPRESSION_WORDS else [expr]
+
+    refs = []
+    tokens = list(tokenize(expr))
+    skip_depth = 0  # inside a (SELECT ...) subquery, which its own scope resolves
+    for index, (kind, text, _, _) in enumerate(tokens):
+        if skip_depth:
+            if text == '(':
+                skip_depth += 1
+            elif text == ')':
+                skip_depth -= 1
+            continue
+        if text == '(' and index + 1 < len(tokens) and tokens[index + 1][1].upper() == 'SELECT':
+            skip_depth = 1
+            continue
+        if kind != 'name' or text.endswith('*'):
+            continue
+        following = tokens[index + 1] if index + 1 < len(tokens) else None
+        preceding = tokens[index - 1][1].upper() if index > 0 else None
+        if following is not None and (following[1] == '(' or following[0] == 'string'):
+            continue
+        if preceding in ('AS', '::') or text.upper() in EXPRESSION_WORDS:
+            continue
+        refs.append(text)
+    return refs
+
+
+def output_name(column):
+    # The name a projection item is visible under from outside its query block, or None
+    if column['alias']:
+        return column['alias'].lower()
+    expr = column['expr']
+    if DOTTED_NAME_REGEX.fullmatch(expr):
+        return split_name(expr)[-1].lower()
+    return None
+
+
+class ScopeResolver:
+    """Maps column references to base tables through derived tables, CTEs and enclosing query blocks.
+
+    Each scope's output columns are resolved once and memoized, so references into a nested block are a
+    dict lookup however often, and from however deep, they are made.
+    """
+
+    def __init__(self, ctes):
+        self.ctes = ctes
+        self._outputs = {}  # Scope -> {output name: [base column, ...]}
+        self._items = {}  # Scope -> [[base column, ...] per projection item]
+        self._stars = {}  # Scope -> names that projection wildcards expose ('*' or a qualifier)
+        self._in_progress = set()  # recursive CTEs refer back to themselves
+
+    def _base(self, ref, column, text):
+        # A FROM entry: a CTE when it names one, otherwise a base table
+        if ref['schema'] == 'N/A' and ref['table'].lower() in self.ctes:
+            return self.lookup(self.ctes[ref['table'].lower()], column)
+        return [{'schema': ref['schema'], 'table': ref['table'], 'column': column, 'ref': text}]
+
+    def _from_source(self, source, column, text):
+        if isinstance(source, Scope):
+            return self.lookup(source, column)
+        return self._base(source, column, text)
+
+    def outputs(self, scope):
+        outputs = self._outputs.get(scope)
+        if outputs is not None:
+            return outputs
+        if scope in self._in_progress:
+            return {}
+        self._in_progress.add(scope)
+
+        outputs = {}
+        stars = []
+        items = []
+        for position, column in enumerate(scope.select.columns):
+            expr = column['expr']
+            if expr == '*' or expr.endswith('.*'):
+                stars.append('*' if expr == '*' else split_name(expr[:-2])[-1].lower())
+            sources = self.resolve_item(scope, position)
+            # UNION branches line up with the first SELECT by position
+            for branch in scope.branches:
+                if position < len(branch.select.columns):
+                    sources = sources + self.resolve_item(branch, position)
+            items.append(sources)
+            name = output_name(column)
+            if name is not None:
+                outputs.setdefault(name, []).extend(sources)
+
+        self._in_progress.discard(scope)
+        self._outputs[scope] = outputs
+        self._items[scope] = items
+        self._stars[scope] = stars
+        return outputs
+
+    def items(self, scope):
+        # Base columns behind each projection item of a block, by position
+        self.outputs(scope)
+        return self._items.get(scope, [])
+
+    def lookup(self, scope, column):
+        # Base columns behind output `column` of a nested query block
+        column = column.lower()
+        outputs = self.outputs(scope)
+        if column in outputs:
+            return outputs[column]
+        # Names a wildcard passes through are resolved on first use and remembered
+        found = []
+        for qualifier in self._stars.get(scope, []):
+            found.extend(self.resolve_reference(scope, column if qualifier == '*' else f"{qualifier}.{column}"))
+        outputs[column] = found
+        return found
+
+    def resolve_reference(self, scope, reference):
+        # reference: 'column', 'qualifier.column' or 'schema.table.column' as written in `scope`
+        parts = split_name(reference)
+        column = parts[-1]
+        if len(parts) > 1:
+            qualifier = parts[-2].lower()
+            # The nearest query block that has the qualifier in its FROM clause owns the reference
+            while scope is not None:
+                source = scope.sources.get(qualifier)
+                if source is not None:
+                    return self._from_source(source, column, reference)
+                scope = scope.parent
+            if qualifier in self.ctes:
+                return self.lookup(self.ctes[qualifier], column)
+            return []
+
+        while scope is not None:
+            sources = list(scope.sources.values())
+            if len(sources) == 1:
+                return self._from_source(sources[0], column, reference)
+            # Among several sources only a nested block that exposes the name can claim it; base
+            # tables give no column list to check, so the reference stays unresolved otherwise
+            claimed = [source for source in sources
+                       if isinstance(source, Scope) and column.lower() in self.outputs(source)]
+            if len(claimed) == 1:
+                return self.lookup(claimed[0], column)
+            if sources:
+                return []
+            scope = scope.parent
+        return []
+
+    def resolve_star(self, scope, qualifier=None):
+        # Everything `*` (or `qualifier.*`) expands to; base tables contribute a '*' column
+        found = []
+        for name, source in scope.sources.items():
+            if qualifier is not None and name != qualifier:
+                continue
+            if isinstance(source, Scope):
+                for columns in self.items(source):
+                    found.extend(columns)
+            elif source['schema'] == 'N/A' and source['table'].lower() in self.ctes:
+                for columns in self.items(self.ctes[source['table'].lower()]):
+                    found.extend(columns)
+            else:
+                found.extend(self._base(source, '*', f"{name}.*"))
+        return found
+
+    def resolve_projection(self, scope, expr):
+        if expr == '*':
+            return self.resolve_star(scope)
+        if expr.endswith('.*'):
+            return self.resolve_star(scope, split_name(expr[:-2])[-1].lower())
+        return self.resolve_expression(scope, expr)
+
+    def resolve_item(self, scope, position):
+        # One projection item, including what the scalar subqueries written inside it select
+        select = scope.select
+        found = self.resolve_projection(scope, select.columns[position]['expr'])
+        if scope.subqueries and select.item_starts:
+            start = select.item_starts[position]
+            end = select.item_starts[position + 1] if position + 1 < len(select.item_starts) else float('inf')
+            for subquery in scope.subqueries:
+                if start <= subquery.select.start < end:
+                    for columns in self.items(subquery):
+                        found.extend(columns)
+        return found
+
+    def resolve_expression(self, scope, expr):
+        found = []
+        for reference in expression_refs(expr):
+            found.extend(self.resolve_reference(scope, reference))
+        return found
+
+
+def resolve_lineage(scan):
+    """Resolves the output columns and ON-clause columns of a scanned statement to base tables.
+
+    Returns {'columns': [{'expr', 'alias', 'sources'}], 'join_columns': [source, ...]}, where each source is
+    {'schema', 'table', 'column', 'ref'} and 'ref' is the reference as written where it meets the base table.
+    """
+    resolver = ScopeResolver(scan['ctes'])
+    # Scopes come innermost first, so every block is resolved before the blocks that select from it
+    for scope in scan['scopes']:
+        resolver.outputs(scope)
+
+    columns = []
+    join_columns = []
+    if scan['scopes']:
+        root = min(scan['scopes'], key=lambda scope: scope.depth)
+        for column, sources in zip(root.select.columns, resolver.items(root)):
+            columns.append({'expr': column['expr'], 'alias': column['alias'], 'sources': sources})
+        for scope in scan['scopes']:
+            for branch in [scope] + scope.branches:
+                for left, right in branch.join_predicates:
+                    join_columns.extend(resolver.resolve_reference(branch, left))
+                    join_columns.extend(resolver.resolve_reference(branch, right))
+
+    return {'columns': columns, 'join_columns': join_columns}
@@ -0,0 +1,69 @@
+import mmap
+import os
+import re
+
+from stage_profile import PROFILE
+
+# Everything up to the next statement-ending ';'. Comments, string literals ('' escapes) and quoted
+# names are consumed whole, so a ';' inside them never matches. One C-level match per statement.
+STATEMENT_BODY_REGEX = re.compile(
+    rb"(?:[^;'\"`\[\-/]+"
+    rb"|--[^\n]*"
+    rb"|/\*.*?(?:\*/|\Z)"
+    rb"|'[^']*(?:''[^']*)*(?:'|\Z)"
+    rb"|\"[^\"]*(?:\"|\Z)"
+    rb"|`[^`]*(?:`|\Z)"
+    rb"|\[[^\]]*(?:\]|\Z)"
+    rb"|[-/])*",
+    re.DOTALL)
+
+# Whitespace and comments in front of a statement; skipped so start_line points at real SQL
+LEADING_TRIVIA_REGEX = re.compile(r"(?:\s+|--[^\n]*|/\*.*?(?:\*/|\Z))*", re.DOTALL)
+
+
+def _statement(text, line):
+    # Trim the raw text between two semicolons; returns (start_line, end_line, statement) or None
+    offset = LEADING_TRIVIA_REGEX.match(text).end()
+    statement = text[offset:].rstrip()
+    if not statement:
+        return None
+    start_line = line + text.count('\n', 0, offset)
+    return start_line, start_line + statement.count('\n'), statement
+
+
+def split_buffer(buffer, encoding='utf-8'):
+    # Yield (start_line, end_line, statement) for every ';'-terminated statement in a bytes-like buffer.
+    # Semicolons inside string literals, quoted names and comments do not end a statement.
+    length = len(buffer)
+    line = 1
+    pos = 0
+    while pos < length:
+        end = STATEMENT_BODY_REGEX.match(buffer, pos).end()
+        text = buffer[pos:end].decode(encoding, errors='replace')
+        statement = _statement(text, line)
+        if statement:
+            yield statement
+        line += text.count('\n')
+        pos = end + 1  # Step over the ';'
+
+
+def split_statements(file_path, encoding='utf-8'):
+    # Stream the statements of a SQL file through mmap, so only the current statement is held in memory
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        PROFILE.count('files')
+        PROFILE.count('bytes', size)
+        if size == 0:
+            return  # mmap cannot map an empty file
+        with PROFILE.timer('read'):
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        with buffer:
+            statements = split_buffer(buffer, encoding)
+            while True:
+                # Only the splitter's own work is timed, not the caller's between two statements
+                with PROFILE.timer('split'):
+                    statement = next(statements, None)
+                if statement is None:
+                    break
+                PROFILE.count('statements')
+                yield statement
@@ -0,0 +1,63 @@
+import json
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+# Stages the lineage scripts time, in pipeline order
+STAGES = ['read', 'split', 'extract', 'classify', 'write']
+
+
+class Profile:
+    # Counters and wall-clock timers for one run; worker processes send theirs back to be merged
+
+    def __init__(self):
+        self.counters = Counter()
+        self.timers = defaultdict(float)
+        self.started = time.perf_counter()
+        self._running = []  # [start, seconds spent in nested timers] per open timer
+
+    @contextmanager
+    def timer(self, stage):
+        # Timers nest; each stage is charged its own time only, nested stages are not counted twice
+        frame = [time.perf_counter(), 0.0]
+        self._running.append(frame)
+        try:
+            yield
+        finally:
+            self._running.pop()
+            elapsed = time.perf_counter() - frame[0]
+            self.timers[stage] += elapsed - frame[1]
+            if self._running:
+                self._running[-1][1] += elapsed
+
+    def count(self, name, amount=1):
+        self.counters[name] += amount
+
+    def snapshot(self):
+        return {'counters': dict(self.counters), 'timers': dict(self.timers)}
+
+    def reset(self):
+        self.counters.clear()
+        self.timers.clear()
+
+    def merge(self, snapshot):
+        self.counters.update(snapshot['counters'])
+        for stage, seconds in snapshot['timers'].items():
+            self.timers[stage] += seconds
+
+    def report(self):
+        # Known stages first, in pipeline order; timers summed over worker processes can exceed wall time
+        stages = STAGES + sorted(set(self.timers) - set(STAGES))
+        return {
+            'wall_seconds': round(time.perf_counter() - self.started, 6),
+            'stage_seconds': {stage: round(self.timers[stage], 6) for stage in stages if stage in self.timers},
+            'counters': dict(sorted(self.counters.items())),
+        }
+
+    def dump(self, profile_path):
+        with open(profile_path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+
+# Shared by every module of a run
+PROFILE = Profile()
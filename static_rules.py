@@ -0,0 +1,165 @@
+import logging
+import re
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Schema, table and column names in the reference data are literal names, wildcards using * and ?,
+# or regular expressions written as re:<pattern>; all of them match case-insensitively
+REGEX_PREFIX = 're:'
+
+
+def is_pattern(name):
+    return name.startswith(REGEX_PREFIX) or '*' in name or '?' in name
+
+
+def field_regex(name):
+    # Fields are joined by newlines, which neither a wildcard nor '.' crosses into the next field
+    if name.startswith(REGEX_PREFIX):
+        return f"(?:{name[len(REGEX_PREFIX):]})"
+    return ''.join('[^\n]*' if char == '*' else '[^\n]' if char == '?' else re.escape(char) for char in name)
+
+
+def required_literal(name):
+    # Longest run of plain characters every matching column contains; for a regex only its plain
+    # leading characters count, and none when it has an alternation
+    if name.startswith(REGEX_PREFIX):
+        pattern = name[len(REGEX_PREFIX):]
+        prefix = re.match(r'\w*', pattern).group()
+        if '|' in pattern or pattern[len(prefix):len(prefix) + 1] in ('?', '*', '{'):
+            # A quantifier after the prefix makes its last character optional
+            prefix = prefix[:-1] if '|' not in pattern else ''
+        return prefix.lower()
+    return max(re.split(r'[*?]', name.lower()), key=len)
+
+
+class LiteralAutomaton:
+    """Aho-Corasick automaton reporting every registered literal found in a text in one pass."""
+
+    def __init__(self, literals):
+        # literals: literal -> rule numbers; states are list indexes, transitions one dict per state
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        for literal, rules in literals.items():
+            state = 0
+            for char in literal:
+                following = self.goto[state].get(char)
+                if following is None:
+                    following = len(self.goto)
+                    self.goto[state][char] = following
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                state = following
+            self.out[state].extend(rules)
+
+        # Breadth-first, so the failure state of every shallower state is known first
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, following in self.goto[state].items():
+                queue.append(following)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[following] = target if target != following else 0
+                self.out[following] = self.out[following] + self.out[self.fail[following]]
+
+    def find(self, text):
+        found = []
+        state = 0
+        for char in text:
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            if self.out[state]:
+                found.extend(self.out[state])
+        return found
+
+
+class RuleMatcher:
+    """Classifies (schema, table, column) names by literal reference rows first, then by pattern rules."""
+
+    def __init__(self, rules):
+        # rules: (schema, table, column, values) in priority order; the first matching row wins
+        self.exact = {}
+        self.patterns = []  # (compiled rule, values) by rule number
+        self.unanchored = []  # rules with no required literal, candidates for every name
+        self._memo = {}  # (schema, table, column) -> values or None; lineage repeats the same names a lot
+        self.exact_hits = 0
+        self.pattern_hits = 0
+
+        literals = {}
+        skipped = 0
+        for schema, table, column, values in rules:
+            # Empty (NaN) or non-text cells never matched a name; leave those rows out
+            if not (isinstance(schema, str) and isinstance(table, str) and isinstance(column, str)):
+                skipped += 1
+                continue
+            if not (is_pattern(schema) or is_pattern(table) or is_pattern(column)):
+                self.exact.setdefault((column.lower(), schema.lower(), table.lower()), values)
+                continue
+            try:
+                regex = re.compile(f"{field_regex(schema)}\n{field_regex(table)}\n{field_regex(column)}",
+                                   re.IGNORECASE)
+            except re.error as e:
+                logger.warning("Skipping classification rule %s.%s.%s: %s", schema, table, column, e)
+                continue
+            number = len(self.patterns)
+            self.patterns.append((regex, values))
+            literal = required_literal(column)
+            if literal:
+                literals.setdefault(literal, []).append(number)
+            else:
+                self.unanchored.append(number)
+
+        # One scan of a column name finds every rule whose literal it contains; only those rules,
+        # and the unanchored ones, are then checked in full
+        self.automaton = LiteralAutomaton(literals)
+        if skipped:
+            logger.warning("Skipped %d classification rules with an empty schema, table or column name", skipped)
+        logger.info("Classification rules: %d literal, %d pattern (%d unanchored)",
+                    len(self.exact), len(self.patterns), len(self.unanchored))
+
+    def match_pattern(self, schema, table, column):
+        key = (schema, table, column)
+        if key in self._memo:
+            return self._memo[key]
+        found = None
+        candidates = self.automaton.find(column)
+        if self.unanchored:
+            candidates.extend(self.unanchored)
+        text = f"{schema}\n{table}\n{column}"
+        for number in sorted(set(candidates)):
+            regex, values = self.patterns[number]
+            if regex.fullmatch(text):
+                found = values
+                break
+        self._memo[key] = found
+        return found
+
+    def classify(self, schema, table, columns):
+        # columns as listed in one lineage row; a literal row for any of them beats every pattern rule
+        schema = schema.lower()
+        table = table.lower()
+        for column in columns:
+            column = column.lower()
+            found = self.exact.get((column, schema, table))
+            if found is None:
+                # Resolved columns are written schema.table.column; a literal row names the bare column
+                qualifier, _, name = column.rpartition('.')
+                if qualifier and qualifier.rsplit('.', 1)[-1] == table:
+                    found = self.exact.get((name, schema, table))
+            if found is not None:
+                self.exact_hits += 1
+                return found
+        if self.patterns:
+            # Patterns describe column names, so qualified references are matched on their last part
+            for column in columns:
+                found = self.match_pattern(schema, table, column.rsplit('.', 1)[-1].lower())
+                if found is not None:
+                    self.pattern_hits += 1
+                    return found
+        return None